@@ -0,0 +1,651 @@
+"""
+Micro-benchmarks for image.py.
+
+Usage:
+    python benchmark.py exif-date [count]
+    python benchmark.py mp4-duration [count]
+    python benchmark.py name-dates [count]
+    python benchmark.py suite [scale ...]
+    python benchmark.py conversion-profiles [count]
+    python benchmark.py alpha-flatten [size]
+    python benchmark.py previews [count]
+    python benchmark.py prefetch [count]
+    python benchmark.py durability [count]
+
+Corpora are generated under TMPDIR, so e.g. TMPDIR=/mnt/nas measures a network share.
+"""
+import io
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+import imageio_ffmpeg
+import numpy as np
+import piexif
+from moviepy import VideoFileClip
+from PIL import Image
+from pillow_heif import register_heif_opener
+
+import image
+
+
+def make_jpeg_corpus(folder, count, size=(1600, 1200), maker_note_bytes=32 * 1024):
+    """
+    Generate JPEGs with EXIF dates, a thumbnail and a MakerNote blob.
+
+    Args:
+        folder (str): Folder to write the files to
+        count (int): Number of files to generate
+        size (tuple): Image dimensions
+        maker_note_bytes (int): Size of the MakerNote payload
+    """
+    os.makedirs(folder, exist_ok=True)
+    thumbnail_path = os.path.join(folder, "thumbnail.tmp")
+    Image.new('RGB', (160, 120), (40, 80, 120)).save(thumbnail_path, 'JPEG')
+    with open(thumbnail_path, 'rb') as f:
+        thumbnail = f.read()
+    os.remove(thumbnail_path)
+
+    for i in range(count):
+        date = f"{2000 + i % 25}:{i % 12 + 1:02d}:{i % 28 + 1:02d} 12:00:00".encode()
+        exif_dict = {
+            "0th": {piexif.ImageIFD.DateTime: date,
+                    piexif.ImageIFD.Make: b"Bench"},
+            "Exif": {piexif.ExifIFD.DateTimeOriginal: date,
+                     piexif.ExifIFD.DateTimeDigitized: date,
+                     piexif.ExifIFD.MakerNote: os.urandom(maker_note_bytes)},
+            "1st": {piexif.ImageIFD.JPEGInterchangeFormat: 0,
+                    piexif.ImageIFD.JPEGInterchangeFormatLength: len(thumbnail)},
+            "thumbnail": thumbnail,
+        }
+        Image.effect_noise(size, 64).convert('RGB').save(
+            os.path.join(folder, f"IMG_{i:06d}.jpg"), 'JPEG',
+            exif=piexif.dump(exif_dict))
+
+
+def make_mp4_corpus(folder, count, durations=(1, 2.5, 3.9, 6)):
+    """
+    Generate small MP4 clips with the ffmpeg binary bundled with moviepy.
+
+    Args:
+        folder (str): Folder to write the files to
+        count (int): Number of files to generate
+        durations (tuple): Clip durations in seconds, used round-robin
+    """
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), '-loglevel', 'error', '-y',
+             '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=15',
+             '-t', str(durations[i % len(durations)]), '-pix_fmt', 'yuv420p',
+             '-metadata', f'creation_time={2000 + i % 25}-06-01T12:00:00Z',
+             os.path.join(folder, f"VID_{i:06d}.mp4")],
+            check=True)
+
+
+def _noise_image(size, mode, seed):
+    """Reproducible noise image, so corpora are identical from run to run."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (size[1], size[0], len(mode)), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def _exif_bytes(date):
+    date = date.strftime('%Y:%m:%d %H:%M:%S').encode()
+    return piexif.dump({"0th": {piexif.ImageIFD.DateTime: date},
+                        "Exif": {piexif.ExifIFD.DateTimeOriginal: date,
+                                 piexif.ExifIFD.DateTimeDigitized: date}})
+
+
+def _corpus_date(i):
+    return datetime(2015 + i % 10, i % 12 + 1, i % 28 + 1, 12, 0, 0)
+
+
+def _tagged(data, ext, i):
+    """
+    Return a template's bytes with a marker for file i in a block decoders skip.
+
+    Every corpus file is then distinct: it has its own inode and page cache
+    pages, and the duplicate finder does not see the corpus as copies.
+    """
+    marker = f"corpus file {i}".encode()
+    if ext in ('.jpg', '.jpeg'):
+        # COM segment right after SOI
+        return data[:2] + b'\xff\xfe' + struct.pack('>H', len(marker) + 2) + marker + data[2:]
+    if ext == '.png':
+        # tEXt chunk before IEND
+        chunk = b'tEXt' + b'Comment\x00' + marker
+        return (data[:-12] + struct.pack('>I', len(chunk) - 4) + chunk
+                + struct.pack('>I', zlib.crc32(chunk)) + data[-12:])
+    # MP4, MOV and HEIC: a trailing ISO BMFF free box
+    return data + struct.pack('>I', len(marker) + 8) + b'free' + marker
+
+
+def _unique_copies(templates, folder, count, name_format):
+    """Fill folder with count distinct copies of the templates, round-robin."""
+    os.makedirs(folder, exist_ok=True)
+    ext = os.path.splitext(name_format)[1].lower()
+    contents = []
+    for path in templates:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    for i in range(count):
+        data = contents[i % len(contents)]
+        with open(os.path.join(folder, name_format.format(i=i, date=_corpus_date(i))),
+                  'wb') as f:
+            f.write(_tagged(data, ext, i))
+
+
+def _copy_tree(source_folder, folder):
+    """Copy every file of source_folder into folder under the same name."""
+    os.makedirs(folder)
+    for entry in image.scan_files(source_folder):
+        shutil.copyfile(entry.path, os.path.join(folder, entry.name))
+
+
+def make_sized_jpeg_corpus(folder, count, sizes=((640, 480), (1600, 1200), (4000, 3000)),
+                           seed=0):
+    """
+    Generate JPEGs of several sizes with per-file EXIF dates and dated names.
+
+    One image is encoded per size; every file is that image with its own EXIF
+    block, so large corpora are quick to build.
+    """
+    os.makedirs(folder, exist_ok=True)
+    templates = []
+    for j, size in enumerate(sizes):
+        buffer = io.BytesIO()
+        _noise_image(size, 'RGB', seed + j).save(buffer, 'JPEG', quality=90)
+        templates.append(buffer.getvalue())
+
+    for i in range(count):
+        date = _corpus_date(i)
+        piexif.insert(_exif_bytes(date), templates[i % len(templates)],
+                      os.path.join(folder, f"IMG_{date:%Y%m%d}_{i:06d}.jpg"))
+
+
+def make_png_corpus(folder, count, size=(800, 600), seed=0):
+    """Generate PNGs with an eXIf date, alternating opaque RGB and RGBA with alpha."""
+    templates = []
+    for j, mode in enumerate(('RGB', 'RGBA')):
+        path = os.path.join(folder, f"template_{mode}.tmp")
+        os.makedirs(folder, exist_ok=True)
+        _noise_image(size, mode, seed + j).save(
+            path, 'PNG', exif=_exif_bytes(_corpus_date(j)))
+        templates.append(path)
+    _unique_copies(templates, folder, count, "PNG_{i:06d}.png")
+    for path in templates:
+        os.remove(path)
+
+
+def make_heic_corpus(folder, count, size=(800, 600), seed=0):
+    """Generate HEIC files with an EXIF date through pillow_heif."""
+    register_heif_opener()
+    os.makedirs(folder, exist_ok=True)
+    templates = []
+    for j in range(2):
+        path = os.path.join(folder, f"template_{j}.tmp")
+        _noise_image(size, 'RGB', seed + j).save(
+            path, 'HEIF', quality=80, exif=_exif_bytes(_corpus_date(j)))
+        templates.append(path)
+    _unique_copies(templates, folder, count, "HEIC_{i:06d}.heic")
+    for path in templates:
+        os.remove(path)
+
+
+def make_video_corpus(folder, count, durations=(1, 2.5, 3.9, 6)):
+    """Generate one MP4 per duration with make_mp4_corpus and make count distinct copies."""
+    template_folder = os.path.join(folder, "templates.tmp")
+    make_mp4_corpus(template_folder, len(durations), durations)
+    templates = [os.path.join(template_folder, name)
+                 for name in sorted(os.listdir(template_folder))]
+    _unique_copies(templates, folder, count, "VID_{date:%Y%m%d}_{i:06d}.mp4")
+    shutil.rmtree(template_folder)
+
+
+def make_corpus(folder, count, seed=0):
+    """
+    Generate a mixed media corpus for the benchmark suite.
+
+    Returns:
+        dict: Media kind ('jpeg', 'png', 'heic', 'mp4') -> folder with count files
+    """
+    folders = {kind: os.path.join(folder, kind) for kind in ('jpeg', 'png', 'heic', 'mp4')}
+    make_sized_jpeg_corpus(folders['jpeg'], count, seed=seed)
+    make_png_corpus(folders['png'], count, seed=seed)
+    make_heic_corpus(folders['heic'], count, seed=seed)
+    make_video_corpus(folders['mp4'], count)
+    return folders
+
+
+def _time_per_file(func, paths):
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def _piexif_date(path):
+    # The lookup filter_images_by_year used before read_exif_date
+    exif_dict = piexif.load(path)
+    if piexif.ExifIFD.DateTimeOriginal in exif_dict["Exif"]:
+        date_str = exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal]
+    else:
+        date_str = exif_dict["0th"][piexif.ImageIFD.DateTime]
+    return datetime.strptime(date_str.decode('utf-8'), '%Y:%m:%d %H:%M:%S')
+
+
+def bench_exif_date(count=1000):
+    """Compare read_exif_date against piexif.load on generated JPEGs."""
+    folder = tempfile.mkdtemp(prefix="bench_exif_")
+    try:
+        make_jpeg_corpus(folder, count)
+        paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+
+        for path in paths:
+            assert image.read_exif_date(path) == _piexif_date(path)
+
+        piexif_time = _time_per_file(_piexif_date, paths)
+        reader_time = _time_per_file(image.read_exif_date, paths)
+
+        print(f"Files: {count}")
+        print(f"piexif.load:    {piexif_time * 1e6:9.1f} us/file")
+        print(f"read_exif_date: {reader_time * 1e6:9.1f} us/file")
+        print(f"Speedup:        {piexif_time / reader_time:9.1f}x")
+    finally:
+        shutil.rmtree(folder)
+
+
+def _moviepy_duration(path):
+    # The probe move_short_videos used before read_mp4_duration
+    with VideoFileClip(path) as video:
+        return video.duration
+
+
+def bench_mp4_duration(count=100):
+    """Compare read_mp4_duration against moviepy's VideoFileClip on generated MP4s."""
+    folder = tempfile.mkdtemp(prefix="bench_mp4_")
+    try:
+        make_mp4_corpus(folder, count)
+        paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+
+        for path in paths:
+            assert abs(image.read_mp4_duration(path) - _moviepy_duration(path)) < 0.1
+
+        moviepy_time = _time_per_file(_moviepy_duration, paths)
+        reader_time = _time_per_file(image.read_mp4_duration, paths)
+
+        print(f"Files: {count}")
+        print(f"VideoFileClip:      {moviepy_time * 1e6:9.1f} us/file")
+        print(f"read_mp4_duration:  {reader_time * 1e6:9.1f} us/file")
+        print(f"Speedup:            {moviepy_time / reader_time:9.1f}x")
+    finally:
+        shutil.rmtree(folder)
+
+
+# The four patterns move_files_by_name searched one after another
+LEGACY_NAME_PATTERNS = [
+    r'(?P<year>19\d{2}|20\d{2})-(?P<month>0[1-9]|1[0-2])-(?P<day>0[1-9]|[12]\d|3[01])',
+    r'(?P<year>19\d{2}|20\d{2})(?P<month>0[1-9]|1[0-2])(?P<day>0[1-9]|[12]\d|3[01])',
+    r'(?P<year>19\d{2}|20\d{2})\.(?P<month>0[1-9]|1[0-2])\.(?P<day>0[1-9]|[12]\d|3[01])',
+    r'(?P<year>19\d{2}|20\d{2})_(?P<month>0[1-9]|1[0-2])_(?P<day>0[1-9]|[12]\d|3[01])',
+]
+
+
+def _legacy_match_date_in_name(filename):
+    for pattern in LEGACY_NAME_PATTERNS:
+        match = re.search(pattern, filename)
+        if match:
+            return match.groups()
+    return None
+
+
+def make_filenames(count, seed=0):
+    """Generate synthetic camera, phone, messenger and undated filenames."""
+    rng = random.Random(seed)
+    templates = [
+        "IMG_{y}{m}{d}_{t}.jpg",
+        "PXL_{y}{m}{d}_{t}123.mp4",
+        "VID_{y}{m}{d}_{t}.mp4",
+        "IMG-{y}{m}{d}-WA{n:04d}.jpeg",
+        "Screenshot_{y}-{m}-{d}-{t}.png",
+        "scan {y}.{m}.{d} page {n}.tif",
+        "holiday_{y}_{m}_{d}_{n}.heic",
+        "DSC{n:05d}.JPG",
+        "IMG_{n:04d}.HEIC",
+        "export-{n}.mov",
+    ]
+    names = []
+    for i in range(count):
+        names.append(rng.choice(templates).format(
+            y=rng.randint(1995, 2030), m=f"{rng.randint(1, 12):02d}",
+            d=f"{rng.randint(1, 28):02d}", t=f"{rng.randint(0, 235959):06d}", n=i % 10000))
+    return names
+
+
+def bench_name_dates(count=1000000):
+    """Classify synthetic filenames with match_date_in_name and the old pattern loop."""
+    names = make_filenames(count)
+
+    start = time.perf_counter()
+    legacy_matched = sum(1 for name in names if _legacy_match_date_in_name(name))
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = sum(1 for name in names if image.match_date_in_name(name))
+    matcher_time = time.perf_counter() - start
+
+    print(f"Filenames: {count} ({matched} dated, {legacy_matched} with the old patterns)")
+    print(f"Four re.search calls:  {legacy_time:7.2f}s")
+    print(f"match_date_in_name:    {matcher_time:7.2f}s")
+    print(f"Speedup:               {legacy_time / matcher_time:7.2f}x")
+
+
+def bench_conversion_profiles(count=20):
+    """Compare output size and time of batch HEIC conversion per CONVERSION_PROFILES entry."""
+    root = tempfile.mkdtemp(prefix="bench_profiles_")
+    try:
+        source = os.path.join(root, "heic")
+        make_heic_corpus(source, count, size=(4032, 3024))
+        print(f"Files: {count} HEIC, 4032x3024")
+        for name in image.CONVERSION_PROFILES:
+            output = os.path.join(root, name)
+            os.makedirs(output)
+            start = time.perf_counter()
+            image.batch_convert_heic_to_jpg(source, output, profile=name, monitor=_quiet())
+            seconds = time.perf_counter() - start
+            print(f"{name:10} {_folder_bytes(output) / 1e6:9.1f} MB {seconds:8.2f}s")
+            shutil.rmtree(output)
+    finally:
+        shutil.rmtree(root)
+
+
+def _legacy_flatten(img):
+    # The flattening convert_png_to_jpg used before _flatten_alpha
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'RGBA':
+            background.paste(img, mask=img.split()[3])
+        else:
+            background.paste(img)
+        return background
+    return img.convert('RGB')
+
+
+def _alpha_png(path, size):
+    """Write an RGBA PNG with a colour gradient and a varying alpha band."""
+    x = np.linspace(0, 255, size[0], dtype=np.float32)
+    y = np.linspace(0, 255, size[1], dtype=np.float32)[:, None]
+    pixels = np.empty((size[1], size[0], 4), dtype=np.uint8)
+    pixels[..., 0] = x
+    pixels[..., 1] = y
+    pixels[..., 2] = (x + y) / 2
+    pixels[..., 3] = np.abs(x - y)
+    Image.fromarray(pixels).save(path, compress_level=1)
+
+
+def bench_alpha_flatten(size=6000):
+    """Compare _flatten_alpha with the split-and-paste path on a large RGBA PNG."""
+    root = tempfile.mkdtemp(prefix="bench_alpha_")
+    try:
+        path = os.path.join(root, "alpha.png")
+        _alpha_png(path, (size, size))
+
+        # Same pixels as the old path for RGBA, and transparency honoured for LA and P
+        with Image.open(path) as img:
+            small = img.resize((64, 64))
+        assert np.array_equal(np.asarray(image._flatten_alpha(small)),
+                              np.asarray(_legacy_flatten(small)))
+        transparent = [Image.new('LA', (4, 4), (0, 0)), Image.new('P', (4, 4), 0)]
+        transparent[1].info['transparency'] = 0
+        for img in transparent:
+            assert np.asarray(image._flatten_alpha(img)).min() == 255
+
+        def decode(flatten):
+            def run(src, work):
+                with Image.open(src) as img:
+                    img.load()
+                    flatten(img)
+            return run
+
+        print(f"Image: {size}x{size} RGBA ({size * size * 4 / 1e6:.0f} MB decoded)")
+        for name, flatten in (("decode only", lambda img: None),
+                              ("split + paste", _legacy_flatten),
+                              ("_flatten_alpha", image._flatten_alpha)):
+            seconds, peak_mb = _measure(decode(flatten), path, root)
+            print(f"{name:15} {seconds:7.2f}s  peak {peak_mb:7.1f} MB")
+    finally:
+        shutil.rmtree(root)
+
+
+def _full_decode_preview(path):
+    # What reviewing the originals costs: a full decode, then a resize
+    with Image.open(path) as img:
+        img.load()
+        img.thumbnail((image.PREVIEW_SIZE, image.PREVIEW_SIZE))
+
+
+def bench_previews(count=1000):
+    """Time contact sheets of 12 MP JPEGs with and without EXIF thumbnails and a PreviewCache."""
+    root = tempfile.mkdtemp(prefix="bench_previews_")
+    try:
+        size = (4000, 3000)
+        template = os.path.join(root, "template")
+        make_jpeg_corpus(template, 1, size=size, maker_note_bytes=1024)
+        thumbnails = os.path.join(root, "thumbnails")
+        _unique_copies([os.path.join(template, "IMG_000000.jpg")], thumbnails, count,
+                       "IMG_{i:06d}.jpg")
+        # Upscaled noise compresses like a photo; pure noise would make entropy
+        # decoding, which no reduced-size decode can skip, dominate every timing
+        no_thumbnails = os.path.join(root, "no_thumbnails")
+        os.makedirs(no_thumbnails)
+        buffer = io.BytesIO()
+        _noise_image((size[0] // 16, size[1] // 16), 'RGB', 0).resize(
+            size, Image.BICUBIC).save(buffer, 'JPEG', quality=90)
+        for i in range(count):
+            piexif.insert(_exif_bytes(_corpus_date(i)), buffer.getvalue(),
+                          os.path.join(no_thumbnails, f"IMG_{i:06d}.jpg"))
+        print(f"Files: {count} JPEG, {size[0]}x{size[1]}, {len(buffer.getvalue()) / 1e6:.1f} MB")
+
+        paths = sorted(entry.path for entry in image.scan_files(no_thumbnails))[:20]
+        print(f"full decode          {_time_per_file(_full_decode_preview, paths) * 1e3:8.1f} ms/file")
+        for name, folder in (("EXIF thumbnail", thumbnails), ("draft decode", no_thumbnails)):
+            paths = sorted(entry.path for entry in image.scan_files(folder))[:200]
+            print(f"{name:20} {_time_per_file(image.make_preview, paths) * 1e3:8.1f} ms/file")
+
+        for name, folder in (("EXIF thumbnail", thumbnails), ("draft decode", no_thumbnails)):
+            with image.PreviewCache(os.path.join(root, f"{name}.sqlite")) as cache:
+                for run in ("cold", "warm"):
+                    start = time.perf_counter()
+                    image.contact_sheet(folder, os.path.join(root, "sheet.jpg"), cache,
+                                        monitor=_quiet())
+                    print(f"sheet, {name}, {run} cache {time.perf_counter() - start:8.2f}s")
+    finally:
+        shutil.rmtree(root)
+
+
+def _drop_cached(folder):
+    """Evict a folder's files from the page cache, so the next reads hit storage."""
+    os.sync()
+    for entry in image.scan_files(folder):
+        fd = os.open(entry.path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def bench_prefetch(count=2000):
+    """Time cold-cache capture-date resolution and date edits with and without a Prefetcher."""
+    root = tempfile.mkdtemp(prefix="bench_prefetch_")
+    try:
+        source = os.path.join(root, "jpeg")
+        make_sized_jpeg_corpus(source, count)
+        print(f"Files: {count} JPEG in {root}")
+        for name, prefetch in (("serial reads", None), ("Prefetcher", image.Prefetcher())):
+            _drop_cached(source)
+            start = time.perf_counter()
+            image.resolve_capture_dates(image.scan_files(source), prefetch=prefetch)
+            dates = time.perf_counter() - start
+
+            _drop_cached(source)
+            output = os.path.join(root, "out")
+            start = time.perf_counter()
+            image.modify_image_dates(source, "2020:01:01 12:00:00", output, monitor=_quiet(),
+                                     prefetch=prefetch)
+            edits = time.perf_counter() - start
+            shutil.rmtree(output)
+            print(f"{name:14} dates {dates:7.2f}s ({dates / count * 1e3:.2f} ms/file)  "
+                  f"edits {edits:7.2f}s ({edits / count * 1e3:.2f} ms/file)")
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_durability(count=2000):
+    """Time modify_image_dates per OutputWriter durability level, with its fsync stage time."""
+    root = tempfile.mkdtemp(prefix="bench_durability_")
+    try:
+        source = os.path.join(root, "jpeg")
+        make_sized_jpeg_corpus(source, count, sizes=((640, 480),))
+        print(f"Files: {count} JPEG in {root}")
+        for durability in image.DURABILITY_LEVELS:
+            output = os.path.join(root, durability)
+            stages = {}
+            monitor = image.BatchMonitor(sinks=[
+                lambda event: stages.update(event['stages']) if event['event'] == 'summary'
+                else None])
+            start = time.perf_counter()
+            image.modify_image_dates(source, "2020:01:01 12:00:00", output, monitor=monitor,
+                                     durability=durability)
+            seconds = time.perf_counter() - start
+            print(f"{durability:6} {seconds:7.2f}s ({seconds / count * 1e3:.2f} ms/file), "
+                  f"fsync {stages.get('fsync', 0):6.2f}s in the background")
+            shutil.rmtree(output)
+    finally:
+        shutil.rmtree(root)
+
+
+def _quiet():
+    return image.BatchMonitor(sinks=[])
+
+
+# (function, corpus kind, whether it moves its inputs, call with input and work folders)
+SUITE_CASES = [
+    ("modify_image_dates", "jpeg", False,
+     lambda src, work: image.modify_image_dates(
+         src, "2021:06:01 12:00:00", os.path.join(work, "out"), monitor=_quiet())),
+    ("filter_images_by_year", "jpeg", False,
+     lambda src, work: image.filter_images_by_year(
+         src, 2020, os.path.join(work, "keep"), os.path.join(work, "other"),
+         monitor=_quiet())),
+    ("move_files_by_name", "jpeg", True,
+     lambda src, work: image.move_files_by_name(src, os.path.join(work, "by_name"))),
+    ("batch_convert_png_to_jpg", "png", False,
+     lambda src, work: image.batch_convert_png_to_jpg(
+         src, os.path.join(work, "out"), monitor=_quiet())),
+    ("batch_convert_heic_to_jpg", "heic", False,
+     lambda src, work: image.batch_convert_heic_to_jpg(
+         src, os.path.join(work, "out"), monitor=_quiet())),
+    ("modify_video_dates", "mp4", False,
+     lambda src, work: image.modify_video_dates(
+         src, "2021:06:01 12:00:00", os.path.join(work, "out"), monitor=_quiet())),
+    ("filter_videos_by_year", "mp4", False,
+     lambda src, work: image.filter_videos_by_year(
+         src, 2020, os.path.join(work, "keep"), os.path.join(work, "other"),
+         monitor=_quiet())),
+    ("move_short_videos", "mp4", True,
+     lambda src, work: image.move_short_videos(src, os.path.join(work, "short"))),
+]
+
+
+def _run_case(run, src, work, conn):
+    # Runs in a forked child: its peak RSS is the case's own
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    start = time.perf_counter()
+    run(src, work)
+    seconds = time.perf_counter() - start
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    conn.send((seconds, peak_kb))
+    conn.close()
+
+
+def _measure(run, src, work):
+    """Run one case in a fresh process and return (seconds, peak RSS in MB)."""
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context("fork").Process(
+        target=_run_case, args=(run, src, work, child))
+    process.start()
+    child.close()
+    try:
+        seconds, peak_kb = parent.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError(f"Benchmark process failed with exit code {process.exitcode}")
+    process.join()
+    return seconds, peak_kb / 1024
+
+
+def _folder_bytes(folder):
+    return sum(entry.stat().st_size for entry in image.scan_files(folder))
+
+
+def bench_suite(*scales):
+    """
+    Time every public batch function on generated corpora at several scales.
+
+    Each case runs in a forked process on its own copy of the corpus, so peak
+    memory is per case and functions that move files leave the corpus intact.
+    """
+    scales = scales or (1000, 10000, 100000)
+    print(f"{'function':28} {'files':>7} {'seconds':>9} {'files/s':>9} "
+          f"{'MB/s':>8} {'peak MB':>8}")
+    for count in scales:
+        root = tempfile.mkdtemp(prefix=f"bench_suite_{count}_")
+        try:
+            folders = make_corpus(os.path.join(root, "corpus"), count)
+            sizes = {kind: _folder_bytes(folder) for kind, folder in folders.items()}
+            for name, kind, moves_inputs, run in SUITE_CASES:
+                work = os.path.join(root, "work")
+                os.makedirs(work)
+                src = folders[kind]
+                if moves_inputs:
+                    src = os.path.join(work, "input")
+                    _copy_tree(folders[kind], src)
+                seconds, peak_mb = _measure(run, src, work)
+                print(f"{name:28} {count:7d} {seconds:9.2f} {count / seconds:9.1f} "
+                      f"{sizes[kind] / 1e6 / seconds:8.1f} {peak_mb:8.1f}")
+                shutil.rmtree(work)
+        finally:
+            shutil.rmtree(root)
+
+
+BENCHMARKS = {
+    "exif-date": bench_exif_date,
+    "mp4-duration": bench_mp4_duration,
+    "name-dates": bench_name_dates,
+    "suite": bench_suite,
+    "conversion-profiles": bench_conversion_profiles,
+    "alpha-flatten": bench_alpha_flatten,
+    "previews": bench_previews,
+    "prefetch": bench_prefetch,
+    "durability": bench_durability,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(__doc__)
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*(int(arg) for arg in sys.argv[2:]))
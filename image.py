@@ -1,36 +1,1127 @@
-from datetime import datetime
-from mutagen.mp4 import MP4
-from PIL import Image
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import argparse
+import csv
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import io
+import itertools
+import json
+import mmap
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from PIL import Image, ImageOps
 import os
 import piexif
+import queue
+import select
 import shutil
+import sqlite3
+import struct
 import subprocess
+import threading
 import time
-from pillow_heif import register_heif_opener
+import tomllib
 import re
-from moviepy import VideoFileClip
 from pathlib import Path
 
+# moviepy, pillow_heif and mutagen are slow to import and only needed by some
+# operations, so they are imported in the functions that use them.
+
 
 image_extensions = {'.jpg', '.jpeg', '.tiff', '.tif'}
 video_extensions = {'.mp4', '.MP4', '.m4v'}
 
 
-def move_invalid_files(input_folder):
+class BatchCounter:
+    """Thread-safe named counters for batch statistics."""
+
+    def __init__(self, *names):
+        self._lock = threading.Lock()
+        self._counts = {name: 0 for name in names}
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def __getitem__(self, name):
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def run_batch(func, jobs, workers=1, pool="thread", on_interrupt=None):
+    """
+    Apply a function to every job, optionally across a worker pool.
+
+    Results are yielded in the same order as the jobs, so output and
+    statistics are deterministic regardless of the number of workers.
+    At most ``workers * 4`` jobs are in flight at once.
+
+    Args:
+        func (callable): Function called as ``func(*job)``. Must be defined at
+            module level when ``pool`` is 'process'.
+        jobs (iterable): Argument tuples, one per file
+        workers (int): Number of workers; 1 runs serially in this thread
+        pool (str): 'thread' or 'process'
+        on_interrupt (callable, optional): Called on Ctrl-C before the pool is
+            shut down, e.g. to kill the subprocesses of running jobs. Jobs that
+            have not started are cancelled.
+
+    Yields:
+        tuple: (job, result, error) where error is the raised exception or None
+    """
+    if pool not in ("thread", "process"):
+        raise ValueError(f"Unknown pool type: {pool}")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        for job in jobs:
+            try:
+                yield job, func(*job), None
+            except KeyboardInterrupt:
+                if on_interrupt is not None:
+                    on_interrupt()
+                raise
+            except Exception as e:
+                yield job, None, e
+        return
+
+    executor_class = ThreadPoolExecutor if pool == "thread" else ProcessPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for job in jobs:
+                pending.append((job, executor.submit(func, *job)))
+                if len(pending) >= workers * 4:
+                    yield _collect_job(*pending.popleft())
+            while pending:
+                yield _collect_job(*pending.popleft())
+        except KeyboardInterrupt:
+            # Leaving the with block waits for every submitted job: stop them first
+            if on_interrupt is not None:
+                on_interrupt()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        except GeneratorExit:
+            # The caller stopped iterating, nobody will collect the queued jobs
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+
+def _collect_job(job, future):
+    try:
+        return job, future.result(), None
+    except Exception as e:
+        return job, None, e
+
+
+class _TimedCall:
+    """Picklable wrapper returning (result, seconds) of a call, for per-file latency."""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        result = self.func(*args)
+        return result, time.perf_counter() - start
+
+
+class MetadataIndex:
+    """
+    SQLite-backed cache of per-file metadata (capture date, duration, size).
+
+    Entries are keyed by absolute path and are only returned while the file's
+    size and mtime, and optionally a quick content hash, are unchanged.
+
+    Args:
+        db_path (str): Path to the SQLite database file
+        verify_hash (bool): Also invalidate entries whose head/tail hash changed
+        commit_every (int): Number of writes between commits
+    """
+
+    FIELDS = ('file_type', 'capture_date', 'duration', 'width', 'height', 'date_source')
+
+    def __init__(self, db_path, verify_hash=False, commit_every=1000):
+        self.verify_hash = verify_hash
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "content_hash TEXT, file_type TEXT, capture_date TEXT, duration REAL, "
+            "width INTEGER, height INTEGER, date_source TEXT)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(metadata)")}
+        if 'date_source' not in columns:
+            # Index written before capture dates recorded where they came from
+            self._conn.execute("ALTER TABLE metadata ADD COLUMN date_source TEXT")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Video dates cached before they were read from the movie header
+            # could be a made-up January 1
+            self._conn.execute("DELETE FROM metadata WHERE file_type = 'video'")
+            self._conn.execute("PRAGMA user_version = 1")
+            self._conn.commit()
+
+    def get(self, path, stat=None):
+        """Return the cached metadata dict for path, or None if missing or stale."""
+        path = os.path.abspath(path)
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT size, mtime_ns, content_hash, {', '.join(self.FIELDS)} "
+                "FROM metadata WHERE path = ?", (path,)).fetchone()
+
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        if self.verify_hash and row[2] != _quick_hash(path):
+            return None
+
+        metadata = dict(zip(self.FIELDS, row[3:]))
+        if metadata['capture_date']:
+            metadata['capture_date'] = datetime.fromisoformat(
+                metadata['capture_date'])
+        return metadata
+
+    def put(self, path, metadata, stat=None):
+        """Store metadata for path along with the stat it was extracted from."""
+        path = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        content_hash = _quick_hash(path) if self.verify_hash else None
+        capture_date = metadata.get('capture_date')
+
+        values = [metadata.get(field) for field in self.FIELDS]
+        values[1] = capture_date.isoformat() if capture_date else None
+
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO metadata (path, size, mtime_ns, content_hash, "
+                f"{', '.join(self.FIELDS)}) VALUES ({', '.join('?' * (4 + len(self.FIELDS)))})",
+                [path, stat.st_size, stat.st_mtime_ns, content_hash] + values)
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def lookup(self, path, extractor):
+        """Return cached metadata for path, calling extractor(path) on a miss."""
+        stat = os.stat(path)
+        metadata = self.get(path, stat)
+        if metadata is None:
+            metadata = extractor(path)
+            self.put(path, metadata, stat)
+        return metadata
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _quick_hash(path, block_size=64 * 1024):
+    """Hash a file's size plus its first and last blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        digest.update(size.to_bytes(8, 'little'))
+        digest.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+
+def _full_hash(path, chunk_size=1024 * 1024):
+    """Hash a file's whole content in fixed-size chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DuplicateIndex:
+    """
+    SQLite-backed cache of content hashes used to find duplicate files.
+
+    Only files whose sizes collide are hashed: first over their head and tail
+    blocks, and in full only when those match as well. Hashes are keyed by
+    absolute path and reused while the file's size and mtime are unchanged, so
+    reruns over a library only hash new or modified files.
+
+    Args:
+        db_path (str): Path to the SQLite database file (in memory by default)
+        commit_every (int): Number of writes between commits
+    """
+
+    def __init__(self, db_path=":memory:", commit_every=1000):
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "quick_hash TEXT, full_hash TEXT)")
+
+    def _hash(self, path, stat, column, hasher):
+        path = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, quick_hash, full_hash FROM hashes WHERE path = ?",
+                (path,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            row = (stat.st_size, stat.st_mtime_ns, None, None)
+        hashes = {'quick_hash': row[2], 'full_hash': row[3]}
+        if hashes[column] is not None:
+            return hashes[column]
+
+        hashes[column] = hasher(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, quick_hash, full_hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns,
+                 hashes['quick_hash'], hashes['full_hash']))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+        return hashes[column]
+
+    def quick_hash(self, path, stat=None):
+        """Return the cached head/tail hash of path, computing it if needed."""
+        return self._hash(path, stat or os.stat(path), 'quick_hash', _quick_hash)
+
+    def full_hash(self, path, stat=None):
+        """Return the cached full content hash of path, computing it if needed."""
+        return self._hash(path, stat or os.stat(path), 'full_hash', _full_hash)
+
+    def _split(self, candidates, hash_func):
+        buckets = {}
+        for path, stat in candidates:
+            buckets.setdefault(hash_func(path, stat), []).append((path, stat))
+        return [bucket for bucket in buckets.values() if len(bucket) > 1]
+
+    def groups(self, files):
+        """
+        Group files with identical content.
+
+        Args:
+            files (iterable): Paths or os.DirEntry objects
+
+        Returns:
+            list: Lists of paths with identical content, each in input order
+        """
+        by_size = {}
+        for file in files:
+            path = os.fspath(file)
+            stat = file.stat() if isinstance(file, os.DirEntry) else os.stat(path)
+            by_size.setdefault(stat.st_size, []).append((path, stat))
+
+        groups = []
+        for same_size in by_size.values():
+            if len(same_size) < 2:
+                continue
+            for same_head in self._split(same_size, self.quick_hash):
+                for same_content in self._split(same_head, self.full_hash):
+                    groups.append([path for path, _ in same_content])
+        return groups
+
+    def originals(self, files):
+        """Map the path of every duplicate in files to the first file with its content."""
+        return {path: group[0] for group in self.groups(files) for path in group[1:]}
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _skip_duplicates(entries, duplicates, counter, log=print):
+    """Return the entries whose content does not duplicate an earlier entry."""
+    if duplicates is None:
+        return entries
+    entries = list(entries)
+    originals = duplicates.originals(entries)
+    kept = []
+    for entry in entries:
+        original = originals.get(entry.path)
+        if original is None:
+            kept.append(entry)
+            continue
+        counter.increment('duplicates')
+        log(f"Skipped {entry.name}: same content as {os.path.basename(original)}")
+    return kept
+
+
+def find_duplicates(input_folder, recursive=False, duplicates=None, monitor=None):
+    """
+    Report the files of a folder that have identical content.
+
+    Args:
+        input_folder (str): Folder to search
+        recursive (bool): Also search subfolders of input_folder
+        duplicates (DuplicateIndex, optional): Cache of previously computed hashes
+        monitor (BatchMonitor, optional): Receives timings and messages instead
+            of printing them
+
+    Returns:
+        list: Lists of paths with identical content
+    """
+    monitor = monitor or BatchMonitor()
+    monitor.begin("find_duplicates")
+    log = monitor.message
+    index = duplicates or DuplicateIndex()
+    try:
+        with monitor.stage('hash'):
+            groups = index.groups(monitor.timed('scan', scan_files(input_folder,
+                                                                   recursive=recursive)))
+    finally:
+        if duplicates is None:
+            index.close()
+
+    for group in groups:
+        log(f"{group[0]} has {len(group) - 1} duplicate(s):")
+        for path in group[1:]:
+            log(f"  {path}")
+    log(f"\nDuplicate groups: {len(groups)}")
+    log(f"Redundant files: {sum(len(group) - 1 for group in groups)}")
+    monitor.finish()
+    return groups
+
+
+def scan_files(folder, extensions=None, recursive=False, ignore_case=True, exclude=()):
+    """
+    Lazily yield the files in a folder as os.DirEntry objects.
+
+    Built on os.scandir, so entries are produced as the directory is read and
+    each entry's stat() result is cached after its first call.
+
+    Args:
+        folder (str): Folder to scan
+        extensions (set, optional): Only yield files with these extensions
+        recursive (bool): Also scan subfolders (symlinked folders are not followed)
+        ignore_case (bool): Compare extensions case-insensitively
+        exclude (iterable): Folders not to descend into, e.g. output folders
+
+    Yields:
+        os.DirEntry: One entry per matching file
+    """
+    if extensions is not None and ignore_case:
+        extensions = {ext.lower() for ext in extensions}
+    excluded = {os.path.realpath(path) for path in exclude}
+
+    pending = [folder]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if recursive and not entry.is_symlink() \
+                            and os.path.realpath(entry.path) not in excluded:
+                        pending.append(entry.path)
+                    continue
+                if extensions is not None:
+                    ext = os.path.splitext(entry.name)[1]
+                    if (ext.lower() if ignore_case else ext) not in extensions:
+                        continue
+                yield entry
+
+
+MANIFEST_FILENAME = ".completed.jsonl"
+PLAN_FIELDS = ('action', 'source', 'destination')
+PLAN_ACTIONS = ('copy', 'move', 'hardlink', 'reflink', 'symlink')
+
+
+class CompletionManifest:
+    """
+    Append-only record of finished outputs, used to skip work on reruns.
+
+    Each line records a source file's size and mtime, the operation settings and
+    the size of the output it produced. An entry only counts while all of them
+    still match, so changed sources, changed settings and truncated outputs are
+    redone. Lines are flushed as they are written, so an interrupted run resumes
+    where it stopped.
+
+    Args:
+        path (str): Path to the JSON lines manifest file
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line of an interrupted run
+                        continue
+                    self._entries[entry['output']] = entry
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, input_path, output_path, settings):
+        """Return True if output_path was produced from the unchanged input_path."""
+        entry = self._entries.get(os.path.abspath(output_path))
+        if entry is None or entry['source'] != os.path.abspath(input_path):
+            return False
+        try:
+            source = os.stat(input_path)
+            output_size = os.path.getsize(output_path)
+        except OSError:
+            return False
+        return (entry['size'] == source.st_size
+                and entry['mtime_ns'] == source.st_mtime_ns
+                and entry['settings'] == settings
+                and entry['output_size'] == output_size)
+
+    def record(self, input_path, output_path, settings):
+        """Record that output_path was produced from input_path with settings."""
+        source = os.stat(input_path)
+        entry = {
+            'output': os.path.abspath(output_path),
+            'source': os.path.abspath(input_path),
+            'size': source.st_size,
+            'mtime_ns': source.st_mtime_ns,
+            'settings': settings,
+            'output_size': os.path.getsize(output_path),
+        }
+        with self._lock:
+            self._entries[entry['output']] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _skip_completed(jobs, manifest, settings, counter, input_index=0):
+    """
+    Yield the jobs whose output manifest does not already record as complete.
+
+    settings is either the same string for every job or a function of the job.
+    """
+    for job in jobs:
+        if manifest is not None and manifest.is_done(
+                job[input_index], job[input_index + 1],
+                settings(job) if callable(settings) else settings):
+            counter.increment('skipped')
+            continue
+        yield job
+
+
+DURABILITY_LEVELS = ('none', 'batch', 'file')
+
+
+_syncfs = None
+
+
+def _sync_filesystem(path):
+    """Write back all dirty data of the filesystem holding path: syncfs on Linux, else sync."""
+    global _syncfs
+    if _syncfs is None:
+        try:
+            _syncfs = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True).syncfs
+        except (OSError, AttributeError):
+            _syncfs = False
+    if _syncfs:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                if _syncfs(fd) == 0:
+                    return
+            finally:
+                os.close(fd)
+    os.sync()
+
+
+def _resolved_path(path):
+    """Return path with its folder resolved, but not the file itself if it is a symlink."""
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(os.path.realpath(folder), name)
+
+
+class OutputWriter:
+    """
+    Crash-safe output commits: outputs are written to temp files and renamed into place.
+
+    A job writes to stage(output_path) and the batch hands the finished file to
+    commit(). A background thread then renames it to its final name, so a
+    crash never leaves a truncated file that looks like a finished output, and
+    makes it durable without blocking the workers:
+
+        'none'   rename only; the OS writes the data back in its own time
+        'batch'  sync the output filesystem once for up to batch_files outputs,
+                 or those committed within batch_ms, rename them, then fsync
+                 each directory once
+        'file'   fsync data, rename and fsync the directory for every output
+
+    An output that replaces its own input (an in-place edit) is written
+    directly and only has its data synced. Temp files of outputs that were
+    never committed are removed by discard_staged(), and those left in folder
+    by an interrupted earlier run when the writer starts.
+
+    Args:
+        durability (str): 'none', 'batch' or 'file'
+        batch_files (int): Outputs per fsync batch with 'batch'
+        batch_ms (float): Milliseconds a committed output waits for its batch at most
+        queue_size (int): Committed outputs waiting for the background thread
+            at most; commit() blocks beyond that
+        folder (str, optional): Output folder to clear of stale temp files
+    """
+
+    TEMP_PATTERN = re.compile(r'\..+\.(\d+)-\d+\.tmp')
+
+    def __init__(self, durability="batch", batch_files=100, batch_ms=200.0, queue_size=1000,
+                 folder=None):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability: {durability}")
+        self.durability = durability
+        self.batch_files = batch_files
+        self.batch_ms = batch_ms
+        self.errors = []
+        self.callback_errors = []
+        self.sync_seconds = 0.0
+        self._staged = {}
+        self._names = itertools.count()
+        self._queue = queue.Queue(maxsize=queue_size)
+        if folder is not None:
+            self._sweep(folder)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _sweep(self, folder):
+        """Remove the temp files that writers of processes no longer running left in folder."""
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return
+        for entry in entries:
+            match = self.TEMP_PATTERN.fullmatch(entry.name)
+            if match is None or not entry.is_file(follow_symlinks=False):
+                continue
+            pid = int(match.group(1))
+            if pid != os.getpid():
+                try:
+                    # Signal 0 only checks whether the process exists
+                    os.kill(pid, 0)
+                    continue
+                except ProcessLookupError:
+                    pass
+                except OSError:
+                    continue
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stage(self, output_path, input_path=None):
+        """
+        Return the path a job should write output_path to.
+
+        Only an output at the input's own path is edited in place. A hardlink or
+        symlink to the input elsewhere gets a temp file like any other output,
+        so writing it never changes the input.
+        """
+        if input_path is not None and _resolved_path(output_path) == _resolved_path(input_path):
+            return output_path
+        folder, name = os.path.split(output_path)
+        temp_path = os.path.join(folder, f".{name}.{os.getpid()}-{next(self._names)}.tmp")
+        self._staged[temp_path] = output_path
+        return temp_path
+
+    def commit(self, path, on_done=None):
+        """
+        Queue a finished output for its rename and sync.
+
+        on_done(output_path) is called from the background thread once the
+        output is in place with the configured durability. Its exceptions are
+        kept in callback_errors, apart from the write errors in errors.
+        """
+        self._queue.put((path, self._staged.pop(path, None), on_done))
+
+    def discard(self, path):
+        """Remove what a failed job left at a staged path."""
+        if self._staged.pop(path, None) is not None and os.path.exists(path):
+            os.remove(path)
+
+    def discard_staged(self):
+        """Remove the temp files of every output that was never committed."""
+        for path in list(self._staged):
+            try:
+                self.discard(path)
+            except OSError:
+                pass
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item:
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.batch_ms / 1000
+            if batch and (item is None or item == () or self.durability != 'batch'
+                          or len(batch) >= self.batch_files
+                          or time.monotonic() >= deadline):
+                self._finish(batch)
+                batch = []
+            if item is None:
+                return
+
+    def _finish(self, batch):
+        """Sync, rename and report a batch of committed outputs."""
+        sync = self.durability != 'none'
+        start = time.perf_counter()
+        if self.durability == 'batch':
+            # One write-back per filesystem instead of a data sync per output
+            folders = {}
+            for path, _, _ in batch:
+                folder = os.path.dirname(os.path.abspath(path))
+                try:
+                    folders.setdefault(os.stat(folder).st_dev, folder)
+                except OSError:
+                    # Reported by the rename below
+                    pass
+            for folder in folders.values():
+                _sync_filesystem(folder)
+
+        done = []
+        for path, output_path, on_done in batch:
+            try:
+                if self.durability == 'file':
+                    fd = os.open(path, os.O_RDONLY)
+                    try:
+                        getattr(os, 'fdatasync', os.fsync)(fd)
+                    finally:
+                        os.close(fd)
+                if output_path is not None:
+                    os.replace(path, output_path)
+                done.append((output_path or path, on_done, output_path is not None))
+            except Exception as e:
+                self.errors.append((output_path or path, e))
+                if output_path is not None and os.path.exists(path):
+                    os.remove(path)
+
+        # The renames are only durable once their directories are synced
+        if sync and hasattr(os, 'O_DIRECTORY'):
+            folders = {os.path.dirname(os.path.abspath(output_path))
+                       for output_path, _, renamed in done if renamed}
+            for folder in folders:
+                fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        self.sync_seconds += time.perf_counter() - start
+
+        for output_path, on_done, _ in done:
+            if on_done is not None:
+                try:
+                    on_done(output_path)
+                except Exception as e:
+                    # The output itself is in place
+                    self.callback_errors.append((output_path, e))
+
+    def close(self):
+        """Wait until every committed output is in place."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _close_writer(writer, counter, succeeded, failed, monitor):
+    """
+    Wait for a batch's outputs and move those that could not be written to the failed count.
+
+    Outputs still staged, because the batch was interrupted or raised before
+    committing them, are removed. The batch's jobs must have stopped by then.
+    """
+    writer.close()
+    writer.discard_staged()
+    monitor.add_stage('fsync', writer.sync_seconds)
+    for output_path, error in writer.errors:
+        counter.increment(succeeded, -1)
+        counter.increment(failed)
+        monitor.message(f"Failed to write {os.path.basename(output_path)}: {error}")
+    for output_path, error in writer.callback_errors:
+        monitor.message(f"Wrote {os.path.basename(output_path)} but could not record it: {error}")
+
+
+def write_plan(plan, plan_path):
+    """Write a plan to a .json or .csv manifest with action/source/destination columns."""
+    # Absolute paths keep the manifest valid from any working directory
+    plan = [
+        {'action': operation['action'],
+         'source': os.path.abspath(operation['source']),
+         'destination': os.path.abspath(operation['destination'])}
+        for operation in plan
+    ]
+    with open(plan_path, 'w', encoding='utf-8', newline='') as f:
+        if plan_path.lower().endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=PLAN_FIELDS)
+            writer.writeheader()
+            writer.writerows(plan)
+        else:
+            json.dump(plan, f, indent=1, ensure_ascii=False)
+
+
+def load_plan(plan_path):
+    """Load a plan written by write_plan."""
+    with open(plan_path, encoding='utf-8', newline='') as f:
+        if plan_path.lower().endswith('.csv'):
+            return list(csv.DictReader(f))
+        return json.load(f)
+
+
+def _link_file(action, source, destination):
+    """Hardlink or symlink source at destination."""
+    if action == 'hardlink':
+        os.link(source, destination)
+    else:
+        os.symlink(os.path.abspath(source), destination)
+
+
+def _is_copy_of(source, destination):
+    """Whether destination is a regular file with the size and mtime of source, as copy2 leaves it."""
+    source_stat = os.stat(source)
+    destination_stat = os.lstat(destination)
+    return (not os.path.islink(destination)
+            and destination_stat.st_size == source_stat.st_size
+            and destination_stat.st_mtime_ns == source_stat.st_mtime_ns)
+
+
+def _apply_operation(action, source, destination):
+    """
+    Apply one plan operation.
+
+    Moves are renames unless they cross filesystems. Hardlinks and symlinks fall
+    back to a copy where the filesystem refuses them, and reflinks to a
+    kernel-side copy where it cannot share extents.
+
+    An existing destination is never written over. A hardlink or symlink to the
+    source (e.g. from an earlier run with another strategy) is replaced, a copy
+    with the source's size and mtime counts as done, and any other file raises
+    FileExistsError.
+    """
+    if os.path.abspath(source) == os.path.abspath(destination):
+        return
+    if os.path.lexists(destination):
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            # Only the link goes, the data stays with the source
+            os.remove(destination)
+        elif action != 'move' and _is_copy_of(source, destination):
+            return
+        else:
+            raise FileExistsError(errno.EEXIST, "Destination already exists", destination)
+
+    if action == 'copy':
+        shutil.copy2(source, destination)
+    elif action == 'move':
+        try:
+            os.rename(source, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(source, destination)
+    elif action in ('hardlink', 'symlink'):
+        try:
+            _link_file(action, source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
+    elif action == 'reflink':
+        _clone_file(source, destination)
+    else:
+        raise ValueError(f"Unknown plan action: {action}")
+
+
+def _output_path(output_folder, input_folder, input_path):
+    """Place a file under output_folder at its path relative to input_folder."""
+    return os.path.join(output_folder, os.path.relpath(input_path, input_folder))
+
+
+def execute_plan(plan, workers=1, log=print, failed=None):
+    """
+    Apply a plan of file operations.
+
+    Operations are grouped by destination folder, so each folder is created
+    once and files for the same folder are written together.
+
+    Args:
+        plan (list or str): Operations as dicts with an action from PLAN_ACTIONS,
+            source and destination, or the path of a plan manifest
+        workers (int): Number of parallel workers (None uses all CPUs)
+        log (callable): Reports failed operations, print by default
+        failed (list, optional): Receives the operations that failed
+
+    Returns:
+        dict: Counts of 'done' and 'failed' operations
+    """
+    if isinstance(plan, str):
+        plan = load_plan(plan)
+
+    groups = {}
+    for operation in plan:
+        groups.setdefault(os.path.dirname(operation['destination']), []).append(operation)
+
+    for folder in groups:
+        os.makedirs(folder or '.', exist_ok=True)
+
+    counter = BatchCounter('done', 'failed')
+    jobs = (
+        (operation['action'], operation['source'], operation['destination'])
+        for operations in groups.values()
+        for operation in operations
+    )
+    for job, _, error in run_batch(_apply_operation, jobs, workers):
+        if error is None:
+            counter.increment('done')
+        else:
+            counter.increment('failed')
+            log(f"Failed to {job[0]} {os.path.basename(job[1])}: {str(error)}")
+            if failed is not None:
+                failed.append({'action': job[0], 'source': job[1], 'destination': job[2]})
+    return counter.as_dict()
+
+
+def _finish_plan(plan, dry_run, plan_path, workers=1, log=print, failed=None):
+    """
+    Write and, unless this is a dry run, execute a plan.
+
+    Returns:
+        int: Number of failed operations, which are also added to failed if given
+    """
+    if plan_path:
+        write_plan(plan, plan_path)
+        log(f"Plan with {len(plan)} operations written to: {plan_path}")
+    if dry_run:
+        log(f"Dry run: {len(plan)} planned operations, nothing was changed")
+        return 0
+    return execute_plan(plan, workers, log, failed)['failed']
+
+
+def move_invalid_files(input_folder, dry_run=False, plan_path=None, monitor=None):
+    """
+    Move files that are neither images nor videos to a sibling invalid_files folder.
+
+    Args:
+        dry_run (bool): Only plan the moves, don't touch any file
+        plan_path (str, optional): Write the plan to this .json or .csv file
+        monitor (BatchMonitor, optional): Receives timings and messages instead
+            of printing them
+    """
     root_folder = os.path.dirname(input_folder)
     invalid_folder = os.path.join(root_folder, "invalid_files")
-    os.makedirs(invalid_folder, exist_ok=True)
-
-    for filename in os.listdir(input_folder):
-        if os.path.splitext(filename.lower())[1] not in image_extensions:
-            if os.path.splitext(filename.lower())[1] not in video_extensions:
-                print(f"******** Moving {filename} (Unknown file type)")
-                shutil.move(os.path.join(input_folder, filename),
-                            os.path.join(invalid_folder, filename))
+    if not dry_run:
+        os.makedirs(invalid_folder, exist_ok=True)
+
+    monitor = monitor or BatchMonitor()
+    monitor.begin("move_invalid_files")
+    log = monitor.message
+    plan = []
+    for entry in monitor.timed('scan', scan_files(input_folder)):
+        if entry.name == MANIFEST_FILENAME:
+            continue
+        if os.path.splitext(entry.name.lower())[1] not in image_extensions:
+            if os.path.splitext(entry.name.lower())[1] not in video_extensions:
+                log(f"******** Moving {entry.name} (Unknown file type)")
+                plan.append({'action': 'move', 'source': entry.path,
+                             'destination': os.path.join(invalid_folder, entry.name)})
             continue
 
+    with monitor.stage('execute'):
+        _finish_plan(plan, dry_run, plan_path, log=log)
+    monitor.finish()
+    return plan
+
+
+def _iter_mp4_boxes(f, start, end):
+    """Yield (type, payload_start, box_end) for the ISO BMFF boxes between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        payload = pos + 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            payload += 8
+        elif size == 0:
+            size = end - pos
+        if size < payload - pos or pos + size > end:
+            raise ValueError(f"Invalid size for MP4 box {box_type!r}")
+        yield box_type, payload, pos + size
+        pos += size
+
+
+def _find_mp4_boxes(f, start, end, path):
+    """Yield (payload_start, box_end) for every box matching a path of box types."""
+    for box_type, payload, box_end in _iter_mp4_boxes(f, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                yield payload, box_end
+            else:
+                yield from _find_mp4_boxes(f, payload, box_end, path[1:])
+
 
-def move_short_videos(source_folder, destination_folder, max_duration=4):
+def _read_mp4_header_duration(f, payload):
+    """Return (timescale, duration) from an mvhd or mdhd box payload."""
+    f.seek(payload)
+    if f.read(1) == b'\x01':
+        f.seek(payload + 20)
+        return struct.unpack('>IQ', f.read(12))
+    f.seek(payload + 12)
+    return struct.unpack('>II', f.read(8))
+
+
+def read_mp4_duration(video_path):
+    """
+    Read the duration of an MP4/MOV file from its movie header.
+
+    Only the moov/mvhd box is read, falling back to the longest moov/trak/mdia/mdhd
+    when the movie header has no duration. No frames are decoded.
+
+    Returns:
+        float: Duration in seconds
+
+    Raises:
+        ValueError: If the file has no usable duration in its headers
+    """
+    with open(video_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        for moov, moov_end in _find_mp4_boxes(f, 0, size, (b'moov',)):
+            for payload, _ in _find_mp4_boxes(f, moov, moov_end, (b'mvhd',)):
+                timescale, duration = _read_mp4_header_duration(f, payload)
+                if timescale and duration not in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+                    return duration / timescale
+
+            durations = [
+                duration / timescale
+                for timescale, duration in (
+                    _read_mp4_header_duration(f, payload)
+                    for payload, _ in _find_mp4_boxes(
+                        f, moov, moov_end, (b'trak', b'mdia', b'mdhd')))
+                if timescale and duration not in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF)
+            ]
+            if durations:
+                return max(durations)
+    raise ValueError("No duration found in MP4 headers")
+
+
+def read_mp4_creation_time(video_path):
+    """
+    Read the creation time of an MP4/MOV file from its movie header.
+
+    Returns:
+        datetime: The creation time, or None if the header leaves it unset
+
+    Raises:
+        ValueError: If the file has no movie header
+    """
+    with open(video_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        for moov, moov_end in _find_mp4_boxes(f, 0, size, (b'moov',)):
+            for payload, _ in _find_mp4_boxes(f, moov, moov_end, (b'mvhd',)):
+                f.seek(payload)
+                if f.read(1) == b'\x01':
+                    f.seek(payload + 4)
+                    creation_time = struct.unpack('>Q', f.read(8))[0]
+                else:
+                    f.seek(payload + 4)
+                    creation_time = struct.unpack('>I', f.read(4))[0]
+                return MP4_EPOCH + timedelta(seconds=creation_time) if creation_time else None
+    raise ValueError("No movie header found")
+
+
+def _mp4_creation_dates(video_paths):
+    """Read the movie header creation times of many videos as datetime64 values."""
+    import numpy as np
+    dates = []
+    for video_path in video_paths:
+        try:
+            dates.append(read_mp4_creation_time(video_path))
+        except (OSError, ValueError, struct.error):
+            dates.append(None)
+    return np.array(dates, dtype='datetime64[s]')
+
+
+def _video_duration(video_path, index=None):
+    """Return a video's duration from the index or container headers, else via moviepy."""
+    if index is not None:
+        try:
+            duration = index.lookup(video_path, _video_metadata)['duration']
+            if duration:
+                return duration
+        except Exception:
+            pass
+
+    try:
+        return read_mp4_duration(video_path)
+    except (ValueError, struct.error):
+        pass
+
+    # Load video and get duration
+    from moviepy import VideoFileClip
+    with VideoFileClip(video_path) as video:
+        return video.duration
+
+
+def move_short_videos(source_folder, destination_folder, max_duration=4, index=None,
+                      recursive=False, monitor=None):
     """
     Find videos shorter than specified duration and move them to a new folder.
 
@@ -38,48 +1129,775 @@ def move_short_videos(source_folder, destination_folder, max_duration=4):
         source_folder (str): Path to the folder containing videos
         destination_folder (str): Path to the folder where short videos will be moved
         max_duration (float): Maximum duration in seconds (default: 4)
+        index (MetadataIndex, optional): Cache of previously extracted durations
+        recursive (bool): Also search subfolders of source_folder. Their
+            subfolders are recreated under destination_folder.
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
     """
     # Create destination folder if it doesn't exist
     Path(destination_folder).mkdir(parents=True, exist_ok=True)
+    monitor = monitor or BatchMonitor()
+    monitor.begin("move_short_videos")
+    log = monitor.message
 
     # Get all video files
-    video_files = []
-    for ext in ['.mov', '.mp4', '.MP4', '.MOV']:
-        video_files.extend(Path(source_folder).glob(f'*{ext}'))
+    video_files = (
+        Path(entry.path)
+        for entry in monitor.timed('scan', scan_files(
+            source_folder, {'.mov', '.mp4', '.MP4', '.MOV'},
+            recursive, ignore_case=False, exclude=[destination_folder]))
+    )
 
     moved_count = 0
 
     for video_path in video_files:
         try:
-            # Load video and get duration
-            with VideoFileClip(str(video_path)) as video:
-                duration = video.duration
+            with monitor.stage('metadata'):
+                duration = _video_duration(str(video_path), index)
 
-            # If video is shorter than max_duration, move it
+            # If video is shorter than max_duration, move it, keeping its subfolder
             if duration < max_duration:
-                destination_path = Path(destination_folder) / video_path.name
-                video_path.rename(destination_path)
-                print(f"Moved {video_path.name} (Duration: {duration:.2f}s)")
+                destination_path = Path(destination_folder) / video_path.relative_to(source_folder)
+                destination_path.parent.mkdir(parents=True, exist_ok=True)
+                with monitor.stage('move'):
+                    _apply_operation('move', str(video_path), str(destination_path))
+                log(f"Moved {video_path.name} (Duration: {duration:.2f}s)")
                 moved_count += 1
+                monitor.file_done(str(destination_path))
+            else:
+                monitor.file_done(str(video_path), 'skipped')
 
         except Exception as e:
-            print(f"Error processing {video_path.name}: {str(e)}")
+            monitor.file_done(str(video_path), 'failed')
+            log(f"Error processing {video_path.name}: {str(e)}")
+
+    log(f"\nMoved {moved_count} videos shorter than {max_duration} seconds")
+    monitor.finish()
+
+
+EXIF_DATE_TAGS = (piexif.ImageIFD.DateTime,
+                  piexif.ExifIFD.DateTimeOriginal,
+                  piexif.ExifIFD.DateTimeDigitized)
+EXIF_TAG_NAMES = {piexif.ImageIFD.DateTime: 'DateTime',
+                  piexif.ExifIFD.DateTimeOriginal: 'DateTimeOriginal',
+                  piexif.ExifIFD.DateTimeDigitized: 'DateTimeDigitized'}
+EXIF_HEADER_BYTES = 64 * 1024
+TIFF_HEADERS = (b'II*\x00', b'MM\x00*')
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _iter_jpeg_segments(f):
+    """Yield (marker, start, end) for each JPEG header segment up to start-of-scan."""
+    pos = 2
+    f.seek(pos)
+    while True:
+        header = f.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            return
+        end = pos + 2 + struct.unpack('>H', header[2:])[0]
+        yield header[1], pos, end
+        if header[1] == 0xDA:
+            return
+        pos = end
+        f.seek(pos)
+
+
+def _locate_jpeg_exif(f):
+    """
+    Locate the EXIF APP1 segment of an open JPEG file.
 
-    print(f"\nMoved {moved_count} videos shorter than {max_duration} seconds")
+    Returns:
+        tuple: (start, end) byte range of the segment. If the file has no EXIF
+        segment, start == end is the position where one should be inserted.
+    """
+    insert_pos = 2
+    for marker, start, end in _iter_jpeg_segments(f):
+        if marker == 0xE1:
+            f.seek(start + 4)
+            if f.read(6) == b'Exif\x00\x00':
+                return start, end
+        elif marker == 0xE0 and start == 2:
+            # Keep a leading JFIF APP0 segment first, like piexif.insert
+            insert_pos = end
+    return insert_pos, insert_pos
+
+
+def _iter_ifd(tiff, offset, endian):
+    """Yield (tag, type, count, value, entry_offset) for each entry of a TIFF IFD."""
+    count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        tag, type_, value_count, value = struct.unpack_from(
+            endian + 'HHII', tiff, entry)
+        yield tag, type_, value_count, value, entry
+
+
+def _exif_date_offsets(tiff):
+    """
+    Find the ASCII EXIF date values in a TIFF structure.
 
+    Returns:
+        dict: Date tag -> (offset, count) of its value within tiff
+    """
+    endian = {b'II': '<', b'MM': '>'}.get(bytes(tiff[:2]))
+    if endian is None:
+        raise ValueError("Invalid TIFF header")
+
+    found = {}
+    exif_ifd = None
+    ifd0 = struct.unpack_from(endian + 'I', tiff, 4)[0]
+    for tag, type_, count, value, _ in _iter_ifd(tiff, ifd0, endian):
+        if tag == piexif.ImageIFD.DateTime and type_ == 2 and count > 4:
+            found[tag] = (value, count)
+        elif tag == piexif.ImageIFD.ExifTag:
+            exif_ifd = value
+
+    if exif_ifd:
+        for tag, type_, count, value, _ in _iter_ifd(tiff, exif_ifd, endian):
+            if tag in EXIF_DATE_TAGS and type_ == 2 and count > 4:
+                found[tag] = (value, count)
+    return found
+
+
+def _exif_tiff_date(tiff, tags=(piexif.ExifIFD.DateTimeOriginal,
+                                 piexif.ImageIFD.DateTime)):
+    """Return the first of tags present in raw EXIF/TIFF bytes as a datetime, or None."""
+    return _exif_tiff_date_tag(tiff, tags)[1]
+
+
+def _exif_tiff_date_tag(tiff, tags):
+    """Return (tag, datetime) for the first of tags present in raw EXIF/TIFF bytes."""
+    if tiff[:6] == b'Exif\x00\x00':
+        tiff = tiff[6:]
+    offsets = _exif_date_offsets(tiff)
+    for tag in tags:
+        if tag in offsets:
+            offset, count = offsets[tag]
+            if offset + count > len(tiff):
+                raise struct.error("EXIF date value outside of buffer")
+            date_str = bytes(tiff[offset:offset + count]).rstrip(b'\x00 ')
+            if date_str:
+                return tag, _parse_exif_datetime(date_str)
+    return None, None
 
-def modify_image_dates(input_folder, new_date_str, output_folder=None, name_addition=""):
+
+def _parse_exif_datetime(date_bytes):
+    """Parse a 'YYYY:MM:DD HH:MM:SS' EXIF value without going through strptime."""
+    if len(date_bytes) == 19 and date_bytes[4:5] == date_bytes[7:8] == b':' \
+            and date_bytes[10:11] == b' ' and date_bytes[13:14] == date_bytes[16:17] == b':':
+        try:
+            return datetime(int(date_bytes[0:4]), int(date_bytes[5:7]), int(date_bytes[8:10]),
+                            int(date_bytes[11:13]), int(date_bytes[14:16]), int(date_bytes[17:19]))
+        except ValueError:
+            pass
+    return datetime.strptime(date_bytes.decode('utf-8'), '%Y:%m:%d %H:%M:%S')
+
+
+def read_exif_date(image_path, tags=(piexif.ExifIFD.DateTimeOriginal,
+                                     piexif.ImageIFD.DateTime)):
     """
-    Batch modify EXIF dates for all images in a folder.
+    Read the capture date of a JPEG or TIFF file from its EXIF header.
+
+    Only the JPEG segment headers and at most the first 64 KB of EXIF data are
+    read, and only the IFDs leading to the date tags are walked. TIFF IFDs past
+    the first 64 KB, e.g. written after the image data, are read through a
+    memory map of the file.
+
+    Args:
+        image_path (str): Path to a JPEG or TIFF file
+        tags (tuple): Date tags to try, in order of preference
+
+    Returns:
+        datetime: The capture date, or None if the file has no date
+    """
+    with open(image_path, 'rb') as f:
+        return _read_exif_date(f, tags)
+
+
+def _read_exif_date(f, tags):
+    """Read the EXIF date of an open JPEG or TIFF file, see read_exif_date."""
+    return _read_exif_date_tag(f, tags)[1]
+
+
+def _read_exif_date_tag(f, tags):
+    """Read (tag, datetime) for the EXIF date of an open JPEG or TIFF file."""
+    f.seek(0)
+    header = f.read(4)
+    if header[:2] == b'\xff\xd8':
+        start, end = _locate_jpeg_exif(f)
+        if start == end:
+            return None, None
+        tiff_start, limit = start + 10, min(end - start - 10, EXIF_HEADER_BYTES)
+    elif header in TIFF_HEADERS:
+        tiff_start, limit = 0, EXIF_HEADER_BYTES
+    else:
+        raise ValueError("Unsupported image format")
+
+    # Dates usually sit in the first few KB; only read on if they don't
+    f.seek(tiff_start)
+    tiff = f.read(min(limit, 4096))
+    try:
+        return _exif_tiff_date_tag(tiff, tags)
+    except struct.error:
+        if len(tiff) == limit and tiff_start > 0:
+            raise
+    if tiff_start > 0:
+        f.seek(tiff_start)
+        return _exif_tiff_date_tag(f.read(limit), tags)
+
+    # The IFDs of a TIFF file can sit anywhere in it, e.g. after the image data:
+    # map the file so only the pages that are walked get read
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as tiff:
+        return _exif_tiff_date_tag(tiff, tags)
+
+
+def _jpeg_dimensions(f):
+    """Return (width, height) from the start-of-frame segment of an open JPEG file."""
+    for marker, start, end in _iter_jpeg_segments(f):
+        if marker in JPEG_SOF_MARKERS:
+            f.seek(start + 5)
+            height, width = struct.unpack('>HH', f.read(4))
+            return width, height
+    return None, None
+
+
+def _read_png_exif(image_path):
+    """Return the raw eXIf chunk of a PNG file by skipping over other chunks, or None."""
+    with open(image_path, 'rb') as f:
+        if f.read(8) != b'\x89PNG\r\n\x1a\n':
+            return None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type == b'eXIf':
+                return f.read(length)
+            if chunk_type == b'IEND':
+                return None
+            f.seek(length + 4, os.SEEK_CUR)
+
+
+def _image_metadata(image_path):
+    """Extract the metadata kept in a MetadataIndex for an image file."""
+    ext = os.path.splitext(image_path.lower())[1]
+    if ext in ('.heic', '.png'):
+        # PNGs keep EXIF in an eXIf chunk that may follow the image data
+        exif = _read_png_exif(image_path) if ext == '.png' else None
+        if ext == '.heic':
+            _register_heif_opener_once()
+        with Image.open(image_path) as img:
+            width, height = img.size
+            exif = exif or img.info.get('exif')
+        tag, capture_date = _exif_tiff_date_tag(
+            exif, (piexif.ExifIFD.DateTimeOriginal,)) if exif else (None, None)
+    else:
+        with open(image_path, 'rb') as f:
+            tag, capture_date = _read_exif_date_tag(
+                f, (piexif.ExifIFD.DateTimeOriginal, piexif.ImageIFD.DateTime))
+            f.seek(0)
+            if f.read(2) == b'\xff\xd8':
+                width, height = _jpeg_dimensions(f)
+            else:
+                f.seek(0)
+                with Image.open(f) as img:
+                    width, height = img.size
+
+    return {'file_type': 'image', 'capture_date': capture_date,
+            'duration': None, 'width': width, 'height': height,
+            'date_source': EXIF_TAG_NAMES.get(tag)}
+
+
+def _parse_mp4_day(value):
     """
+    Parse a full ©day timestamp, e.g. '2020-03-04T05:06:07Z', as naive UTC.
 
-    # Validate the date format
+    Returns:
+        datetime: The timestamp, or None if it is only a year or not a timestamp
+    """
     try:
-        new_date = datetime.strptime(new_date_str, '%Y:%m:%d %H:%M:%S')
+        date = datetime.fromisoformat(value.strip())
     except ValueError:
-        print("Error: Date must be in format 'YYYY:MM:DD HH:MM:SS'")
+        return None
+    if date.tzinfo is not None:
+        # Same convention as the movie header, which is UTC
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def _video_metadata(video_path):
+    """Extract the metadata kept in a MetadataIndex for an MP4/MOV file."""
+    from mutagen.mp4 import MP4
+    video = MP4(video_path)
+
+    # The movie header date, as read by the shift mode and the pipeline, then
+    # a full ©day timestamp; callers fall back to the mtime without either
+    capture_date = date_source = None
+    try:
+        capture_date = read_mp4_creation_time(video_path)
+    except (ValueError, struct.error):
+        pass
+    if capture_date is not None:
+        date_source = 'mvhd'
+    elif '©day' in video:
+        capture_date = _parse_mp4_day(video['©day'][0])
+        date_source = '©day' if capture_date is not None else None
+
+    return {'file_type': 'video', 'capture_date': capture_date,
+            'duration': video.info.length, 'width': None, 'height': None,
+            'date_source': date_source}
+
+
+def _is_video(path):
+    """Whether path has the extension of a video container with MP4 metadata."""
+    return os.path.splitext(path)[1].lower() in ('.mp4', '.m4v', '.mov')
+
+
+def _file_metadata(path):
+    """Extract index metadata with the reader for the file's format."""
+    if _is_video(path):
+        return _video_metadata(path)
+    return _image_metadata(path)
+
+
+def _cached_file_metadata(path, metadata=None):
+    """Return metadata if already known, else extract it from the file."""
+    if metadata is None:
+        metadata = _file_metadata(path)
+    return metadata
+
+
+def _prefetch_file(path, head_bytes, whole_file):
+    """Start reading the bytes of a file that its handler will read, into the page cache."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if whole_file or size <= 2 * head_bytes:
+            ranges = [(0, size)]
+        else:
+            # Headers, and the trailing metadata of MP4s with the moov box last
+            ranges = [(0, head_bytes), (size - head_bytes, head_bytes)]
+        for offset, length in ranges:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+            else:
+                while length > 0:
+                    chunk = os.pread(fd, min(length, 1024 * 1024), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    length -= len(chunk)
+    finally:
+        os.close(fd)
+
+
+class Prefetcher:
+    """
+    Read-ahead for batches on slow storage such as a NAS.
+
+    Wraps the files of a batch and, while the handler parses one file, keeps
+    the next files' reads in flight: reader threads open them and request
+    their headers (or the whole files) with posix_fadvise(WILLNEED), or read
+    them where that is not available. The handlers then find the bytes in the
+    page cache instead of waiting for the network, file after file.
+
+    Args:
+        depth (int): Files kept in flight ahead of the handler
+        budget (int): Bytes requested ahead of the handler at most
+        head_bytes (int): Bytes read at the start, and end, of each file when
+            only metadata is needed
+        readers (int): Threads opening and reading ahead files
+    """
+
+    def __init__(self, depth=32, budget=64 * 1024 * 1024, head_bytes=EXIF_HEADER_BYTES,
+                 readers=4):
+        self.depth = depth
+        self.budget = budget
+        self.head_bytes = head_bytes
+        self.readers = readers
+
+    def __call__(self, items, whole_files=False, key=os.fspath):
+        """
+        Yield items unchanged while reading ahead of them.
+
+        Args:
+            items (iterable): Paths, os.DirEntry objects or jobs
+            whole_files (bool): Read ahead whole files instead of their headers
+            key (callable): Returns the path to read ahead for an item, or None
+                to skip it (e.g. when its metadata is cached)
+        """
+        with ThreadPoolExecutor(max_workers=self.readers) as executor:
+            ahead = deque()
+            in_flight = 0
+            items = iter(items)
+            exhausted = False
+            while True:
+                while not exhausted and len(ahead) < self.depth and \
+                        (in_flight < self.budget or not ahead):
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    path = key(item)
+                    size = 0
+                    if path is not None:
+                        try:
+                            size = os.stat(path).st_size if whole_files \
+                                else 2 * self.head_bytes
+                        except OSError:
+                            # The handler reports missing files
+                            path = None
+                    if path is not None:
+                        executor.submit(_prefetch_file, path, self.head_bytes, whole_files)
+                    ahead.append((item, size))
+                    in_flight += size
+                if not ahead:
+                    return
+                item, size = ahead.popleft()
+                in_flight -= size
+                yield item
+
+
+def resolve_capture_dates(files, workers=1, pool="thread", index=None, mtime_fallback=False,
+                          monitor=None, prefetch=None):
+    """
+    Resolve the capture dates of many images and videos at once.
+
+    Each file is read with the cheapest reader for its format: the EXIF header
+    of JPEG and TIFF files, the eXIf chunk of PNGs, the EXIF block pillow_heif
+    exposes for HEIC files and the metadata atoms of MP4/MOV videos.
+
+    Args:
+        files (iterable): Paths or os.DirEntry objects
+        workers (int): Number of parallel workers (None uses all CPUs)
+        pool (str): 'thread' or 'process' worker pool
+        index (MetadataIndex, optional): Cache of previously extracted dates
+        mtime_fallback (bool): Use the file modification time for files without
+            a stored date
+        monitor (BatchMonitor, optional): Receives each file's read latency
+        prefetch (Prefetcher, optional): Read the headers of the next files
+            ahead while one is parsed
+
+    Returns:
+        dict: Columns of equal length as NumPy arrays: 'path', 'date'
+        (datetime64[s], NaT when unknown), 'source' (the field the date was read
+        from, '' when unknown) and 'error' (None, or why the file could not be read)
+    """
+    import numpy as np
+    jobs = (
+        (os.fspath(file), index.get(os.fspath(file), file.stat()
+                                    if isinstance(file, os.DirEntry) else None)
+         if index is not None else None)
+        for file in files
+    )
+    if prefetch is not None:
+        # Files found in the index are not read at all
+        jobs = prefetch(jobs, key=lambda job: job[0] if job[1] is None else None)
+
+    paths, dates, sources, errors = [], [], [], []
+    for job, timed, error in run_batch(_TimedCall(_cached_file_metadata), jobs, workers, pool):
+        capture_date, source = None, ''
+        if monitor is not None:
+            if error is None:
+                monitor.add_stage('metadata', timed[1])
+                monitor.file_done(job[0], seconds=timed[1])
+            else:
+                monitor.file_done(job[0], 'failed')
+        if error is None:
+            metadata = timed[0]
+            if index is not None and job[1] is None:
+                index.put(job[0], metadata)
+            capture_date = metadata['capture_date']
+            if capture_date is not None:
+                source = metadata.get('date_source') or ''
+            elif mtime_fallback:
+                capture_date = datetime.fromtimestamp(os.stat(job[0]).st_mtime)
+                source = 'mtime'
+        paths.append(job[0])
+        dates.append(capture_date)
+        sources.append(source)
+        errors.append(str(error) if error is not None else None)
+
+    return {'path': np.array(paths, dtype=object),
+            'date': np.array(dates, dtype='datetime64[s]'),
+            'source': np.array(sources, dtype=object),
+            'error': np.array(errors, dtype=object)}
+
+
+def capture_date_buckets(dates, unit='Y'):
+    """
+    Bucket capture dates by year, month or day in one vectorized operation.
+
+    Args:
+        dates (numpy.ndarray): datetime64 dates, e.g. resolve_capture_dates()['date']
+        unit (str): 'Y', 'M' or 'D'
+
+    Returns:
+        numpy.ndarray: The dates truncated to unit; unknown dates stay NaT
+    """
+    import numpy as np
+    return np.asarray(dates).astype(f'datetime64[{unit}]')
+
+
+def _splice_range(src_fd, dst_fd, offset, count):
+    """Append count bytes of src_fd starting at offset to dst_fd, in the kernel where possible."""
+    while count > 0:
+        try:
+            sent = os.copy_file_range(src_fd, dst_fd, count, offset)
+        except (AttributeError, OSError):
+            try:
+                sent = os.sendfile(dst_fd, src_fd, offset, count)
+            except (AttributeError, OSError):
+                sent = os.write(dst_fd, os.pread(
+                    src_fd, min(count, 1024 * 1024), offset))
+        if sent == 0:
+            raise IOError("Unexpected end of file while copying")
+        offset += sent
+        count -= sent
+
+
+def _rewrite_exif_dates(input_path, output_path, date_bytes):
+    """
+    Write an image to output_path with its EXIF dates replaced, in a single pass.
+
+    The bytes before the EXIF segment are copied, the patched segment is
+    written, and the rest of the file is spliced with copy_file_range/sendfile.
+    When all date fields already exist with the same width as the new value
+    they are patched in place; if input and output are the same file nothing
+    else is written.
+
+    Returns:
+        bool: False if the layout is not supported and piexif should be used
+    """
+    value = date_bytes + b'\x00'
+    same_file = os.path.exists(output_path) and os.path.samefile(
+        input_path, output_path)
+
+    with open(input_path, 'rb') as f:
+        src_fd = f.fileno()
+        size = os.fstat(src_fd).st_size
+        header = f.read(4)
+
+        if header[:2] == b'\xff\xd8':
+            start, end = _locate_jpeg_exif(f)
+            f.seek(start)
+            segment = bytearray(f.read(end - start))
+            tiff_start = 10
+        elif header in TIFF_HEADERS:
+            start, end = 0, min(size, EXIF_HEADER_BYTES)
+            f.seek(0)
+            segment = bytearray(f.read(end))
+            tiff_start = 0
+        else:
+            return False
+
+        try:
+            offsets = _exif_date_offsets(memoryview(segment)[tiff_start:]) \
+                if segment else {}
+        except (ValueError, struct.error):
+            offsets = {}
+
+        fixed_width = all(
+            tag in offsets and offsets[tag][1] == len(value)
+            and tiff_start + offsets[tag][0] + len(value) <= len(segment)
+            for tag in EXIF_DATE_TAGS)
+
+        if fixed_width:
+            patches = [start + tiff_start + offsets[tag][0]
+                       for tag in EXIF_DATE_TAGS]
+            if same_file:
+                with open(output_path, 'r+b') as out:
+                    for position in patches:
+                        os.pwrite(out.fileno(), value, position)
+                return True
+            for position in patches:
+                segment[position - start:position - start + len(value)] = value
+        elif tiff_start == 0:
+            # TIFF files without fixed-width dates need a full rewrite
+            return False
+        else:
+            exif_dict = piexif.load(bytes(segment[4:])) if segment else {
+                "0th": {}, "Exif": {}}
+            exif_dict["0th"][piexif.ImageIFD.DateTime] = date_bytes
+            exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_bytes
+            exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_bytes
+            exif_bytes = piexif.dump(exif_dict)
+            segment = b'\xff\xe1' + \
+                struct.pack('>H', len(exif_bytes) + 2) + exif_bytes
+
+        write_path = output_path + '.tmp' if same_file else output_path
+        dst_fd = os.open(write_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            _splice_range(src_fd, dst_fd, 0, start)
+            os.write(dst_fd, segment)
+            _splice_range(src_fd, dst_fd, end, size - end)
+        finally:
+            os.close(dst_fd)
+
+    shutil.copystat(input_path, write_path)
+    if same_file:
+        os.replace(write_path, output_path)
+    return True
+
+
+def _modify_image_date(input_path, output_path, date_bytes):
+    """Copy one image to output_path with all EXIF date fields set to date_bytes."""
+    # Stream the file once, patching the EXIF segment on the way
+    if _rewrite_exif_dates(input_path, output_path, date_bytes):
+        return
+
+    # Load EXIF data
+    exif_dict = piexif.load(input_path)
+
+    # Update all date fields in EXIF
+    if "0th" in exif_dict:
+        exif_dict["0th"][piexif.ImageIFD.DateTime] = date_bytes
+    if "Exif" in exif_dict:
+        exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_bytes
+        exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_bytes
+
+    # Convert modified EXIF data to bytes
+    exif_bytes = piexif.dump(exif_dict)
+
+    # Copy image and update EXIF
+    shutil.copy2(input_path, output_path)
+    piexif.insert(exif_bytes, output_path)
+
+
+def load_date_map(csv_path, base_folder=None):
+    """
+    Load new dates per file from a CSV file with 'path' and 'date' columns.
+
+    Dates may use the EXIF format ('YYYY:MM:DD HH:MM:SS') or ISO 8601. Relative
+    paths are resolved against base_folder, by default the CSV file's folder.
+
+    Returns:
+        dict: Absolute path -> datetime
+    """
+    if base_folder is None:
+        base_folder = os.path.dirname(os.path.abspath(csv_path))
+
+    date_map = {}
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            value = row['date'].strip()
+            try:
+                date = _parse_exif_datetime(value.encode('utf-8'))
+            except ValueError:
+                date = datetime.fromisoformat(value)
+            date_map[os.path.abspath(os.path.join(base_folder, row['path']))] = date
+    return date_map
+
+
+def _date_arguments(input_folder, new_date_str, shift, date_map, log=print):
+    """
+    Validate the date arguments of a batch date edit.
+
+    Returns:
+        tuple: (new_date, date_map) with the map keyed by absolute path, or None
+        after logging why the arguments are invalid
+    """
+    if sum(arg is not None for arg in (new_date_str, shift, date_map)) != 1:
+        log("Error: Give exactly one of new_date_str, shift or date_map")
+        return None
+
+    new_date = None
+    if new_date_str is not None:
+        try:
+            new_date = datetime.strptime(new_date_str, '%Y:%m:%d %H:%M:%S')
+        except ValueError:
+            log("Error: Date must be in format 'YYYY:MM:DD HH:MM:SS'")
+            return None
+    elif isinstance(date_map, str):
+        date_map = load_date_map(date_map, input_folder)
+    elif date_map is not None:
+        date_map = {os.path.abspath(os.path.join(input_folder, path)): date
+                    for path, date in date_map.items()}
+    return new_date, date_map
+
+
+def _new_dates(entries, new_date, shift, date_map, read_dates, counter, log=print):
+    """
+    Pair each entry with its new date, computed for the whole batch at once.
+
+    An absolute new_date keeps the listing lazy. A shift reads every existing date
+    with read_dates(paths) and offsets them in one vectorized step; a date map is
+    looked up per path. Entries without a new date are counted as 'undated'.
+
+    Yields:
+        tuple: (entry, datetime)
+    """
+    import numpy as np
+    if new_date is not None:
+        for entry in entries:
+            yield entry, new_date
         return
 
+    entries = list(entries)
+    paths = [entry.path for entry in entries]
+    if date_map is not None:
+        dates = np.array([date_map.get(os.path.abspath(path)) for path in paths],
+                         dtype='datetime64[s]')
+    else:
+        dates = (read_dates(paths) + np.timedelta64(shift)).astype('datetime64[s]')
+
+    for entry, date in zip(entries, dates.astype(object)):
+        if date is None:
+            counter.increment('undated')
+            if date_map is None:
+                log(f"Skipped {entry.name}: no date to shift")
+            continue
+        yield entry, date
+
+
+def _exif_date_settings(job):
+    """Manifest settings of a _modify_image_date job."""
+    return f"exif-date:{job[2].decode('utf-8')}"
+
+
+def modify_image_dates(input_folder, new_date_str=None, output_folder=None, name_addition="",
+                       workers=1, pool="thread", incremental=False, duplicates=None,
+                       shift=None, date_map=None, monitor=None, prefetch=None,
+                       durability="batch"):
+    """
+    Batch modify EXIF dates for all images in a folder.
+
+    Every image gets new_date_str, its own date moved by shift, or its entry of
+    date_map; exactly one of the three must be given.
+
+    Args:
+        new_date_str (str, optional): New date as 'YYYY:MM:DD HH:MM:SS'
+        shift (timedelta, optional): Offset added to each image's EXIF date,
+            e.g. to correct a camera clock
+        date_map (str or dict, optional): CSV file with 'path' and 'date' columns,
+            or a dict of path -> datetime. Relative paths are resolved against
+            input_folder.
+        workers (int): Number of parallel workers (None uses all CPUs)
+        pool (str): 'thread' or 'process' worker pool
+        incremental (bool): Skip images already written with the same date, as
+            recorded in the output folder's manifest
+        duplicates (DuplicateIndex, optional): Skip images whose content
+            duplicates another image of the folder
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+        prefetch (Prefetcher, optional): Read the next images ahead while one
+            is written, only their headers for in-place edits, to hide storage
+            latency
+        durability (str): When outputs are synced to disk, see OutputWriter
+    """
+    monitor = monitor or BatchMonitor()
+    monitor.begin("modify_image_dates")
+    log = monitor.message
+
+    # Validate the dates
+    dates = _date_arguments(input_folder, new_date_str, shift, date_map, log)
+    if dates is None:
+        monitor.finish()
+        return
+    new_date, date_map = dates
+
     # Setup output folder
     if output_folder is None:
         output_folder = os.path.join(input_folder, "modified_images")
@@ -87,165 +1905,495 @@ def modify_image_dates(input_folder, new_date_str, output_folder=None, name_addi
     # Create output folder if it doesn't exist
     os.makedirs(output_folder, exist_ok=True)
 
-    # Convert date to bytes for EXIF
-    date_str = new_date.strftime('%Y:%m:%d %H:%M:%S')
-    date_bytes = date_str.encode('utf-8')
-
     # Process all files in the folder
-    image_extensions = {'.jpg', '.jpeg', '.tiff', '.tif'}
-    successful = 0
-    failed = 0
+    counter = BatchCounter('successful', 'failed', 'skipped', 'duplicates', 'undated')
+    manifest = CompletionManifest(os.path.join(
+        output_folder, MANIFEST_FILENAME)) if incremental else None
+    writer = OutputWriter(durability, folder=output_folder)
+
+    entries = monitor.timed('scan', scan_files(input_folder, image_extensions))
+    same_folder = os.path.realpath(output_folder) == os.path.realpath(input_folder)
+    if same_folder:
+        # Outputs land in the folder being scanned: list it before writing
+        entries = list(entries)
+    entries = _skip_duplicates(entries, duplicates, counter, log)
+
+    def read_dates(paths):
+        with monitor.stage('metadata'):
+            return resolve_capture_dates(paths, workers, pool, prefetch=prefetch)['date']
+
+    jobs = (
+        # Convert date to bytes for EXIF
+        (entry.path, os.path.join(output_folder, name_addition + entry.name),
+         date.strftime('%Y:%m:%d %H:%M:%S').encode('utf-8'))
+        for entry, date in _new_dates(entries, new_date, shift, date_map, read_dates,
+                                      counter, log)
+    )
+    jobs = _skip_completed(jobs, manifest, _exif_date_settings, counter)
+    jobs = ((input_path, writer.stage(output_path, input_path), date_bytes)
+            for input_path, output_path, date_bytes in jobs)
+    if prefetch is not None:
+        # Outputs elsewhere copy every image in full; in-place edits only
+        # rewrite the EXIF header
+        jobs = prefetch(jobs, whole_files=not (same_folder and not name_addition),
+                        key=lambda job: job[0])
+
+    results = run_batch(_TimedCall(_modify_image_date), jobs, workers, pool)
+    try:
+        for job, timed, error in results:
+            if error is None:
+                counter.increment('successful')
+                monitor.add_stage('write', timed[1])
+                monitor.file_done(job[0], seconds=timed[1])
+                # Recorded once the output is in place
+                writer.commit(job[1], None if manifest is None else (
+                    lambda output_path, job=job: manifest.record(
+                        job[0], output_path, _exif_date_settings(job))))
+            else:
+                writer.discard(job[1])
+                counter.increment('failed')
+                monitor.file_done(job[0], 'failed')
+                log(f"Failed to process {os.path.basename(job[0])}: {str(error)}")
+    finally:
+        # Stops the jobs still running before their outputs are cleaned up
+        results.close()
+        _close_writer(writer, counter, 'successful', 'failed', monitor)
+        if manifest is not None:
+            manifest.close()
+
+    successful = counter['successful']
+    failed = counter['failed']
+    if successful > 0:
+        log(f"\nProcessing complete:")
+        log(f"Successfully processed: {successful} images")
+        log(f"Modified images saved to: {output_folder}")
+    if counter['skipped'] > 0:
+        log(f"Skipped (already up to date): {counter['skipped']} images")
+    if counter['duplicates'] > 0:
+        log(f"Skipped (duplicate content): {counter['duplicates']} images")
+    if counter['undated'] > 0:
+        log(f"Skipped (no new date): {counter['undated']} images")
+    if failed > 0:
+        log(f"!!!!!!!!!!!!!!! Failed to process: {failed} images !!!!!!!!!!!!!!!")
+    monitor.finish()
 
-    for filename in os.listdir(input_folder):
-        if os.path.splitext(filename.lower())[1] not in image_extensions:
-            continue
 
-        input_path = os.path.join(input_folder, filename)
-        output_path = os.path.join(output_folder, name_addition + filename)
+MP4_EPOCH = datetime(1904, 1, 1)
+FICLONE = 0x40049409
 
-        try:
-            # Load EXIF data
-            exif_dict = piexif.load(input_path)
 
-            # Update all date fields in EXIF
-            if "0th" in exif_dict:
-                exif_dict["0th"][piexif.ImageIFD.DateTime] = date_bytes
-            if "Exif" in exif_dict:
-                exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_bytes
-                exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_bytes
+def _clone_file(input_path, output_path):
+    """Copy a file as a reflink where the filesystem supports it, else a regular copy."""
+    if os.path.exists(output_path) and os.path.samefile(input_path, output_path):
+        # Opening the output for writing would truncate the input
+        raise ValueError(f"{output_path} is the same file as {input_path}")
+    with open(input_path, 'rb') as src, open(output_path, 'wb') as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                cloned = True
+            except OSError:
+                cloned = False
+        if fcntl is None or not cloned:
+            _splice_range(src.fileno(), dst.fileno(), 0,
+                          os.fstat(src.fileno()).st_size)
+    shutil.copystat(input_path, output_path)
 
-            # Convert modified EXIF data to bytes
-            exif_bytes = piexif.dump(exif_dict)
 
-            # Copy image and update EXIF
-            shutil.copy2(input_path, output_path)
-            piexif.insert(exif_bytes, output_path)
+def _patch_mp4_times(video_path, new_date):
+    """
+    Overwrite the creation/modification times of an MP4 in place.
 
-            successful += 1
+    Patches moov/mvhd, every trak/tkhd and trak/mdia/mdhd, and moov/udta/meta/ilst
+    ©day when the new value has the same length as the stored one. No other
+    bytes of the file are touched.
 
-        except Exception as e:
-            failed += 1
-            print(f"Failed to process {filename}: {str(e)}")
+    Raises:
+        ValueError: If the file has no movie header or the date does not fit
+    """
+    mp4_time = int((new_date - MP4_EPOCH).total_seconds())
+    header_paths = [(b'mvhd',), (b'trak', b'tkhd'), (b'trak', b'mdia', b'mdhd')]
+
+    with open(video_path, 'r+b') as f:
+        size = os.fstat(f.fileno()).st_size
+        patches = []
+        has_movie_header = False
+        for moov, moov_end in _find_mp4_boxes(f, 0, size, (b'moov',)):
+            for path in header_paths:
+                for payload, _ in _find_mp4_boxes(f, moov, moov_end, path):
+                    f.seek(payload)
+                    if f.read(1) == b'\x01':
+                        patches.append((payload + 4, struct.pack('>QQ', mp4_time, mp4_time)))
+                    elif mp4_time <= 0xFFFFFFFF:
+                        patches.append((payload + 4, struct.pack('>II', mp4_time, mp4_time)))
+                    else:
+                        raise ValueError("Date does not fit a version 0 MP4 header")
+                    has_movie_header = has_movie_header or path == (b'mvhd',)
+
+            ilst_day = (b'udta', b'meta', b'ilst', b'\xa9day', b'data')
+            for payload, box_end in _find_mp4_boxes(f, moov, moov_end, ilst_day[:2]):
+                # meta is a full box: skip its version/flags
+                for data, data_end in _find_mp4_boxes(f, payload + 4, box_end, ilst_day[2:]):
+                    f.seek(data + 8)
+                    old_value = f.read(data_end - data - 8)
+                    for fmt in ('%Y', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S+0000'):
+                        value = new_date.strftime(fmt).encode()
+                        if len(value) == len(old_value):
+                            patches.append((data + 8, value))
+                            break
+
+        if not has_movie_header:
+            raise ValueError("No movie header found")
+
+        for position, value in patches:
+            f.seek(position)
+            f.write(value)
+
+
+def _patch_video_date(input_path, output_path, new_date):
+    """Write output_path as a reflink/copy of input_path with patched MP4 dates."""
+    same_file = os.path.exists(output_path) and os.path.samefile(
+        input_path, output_path)
+    if same_file:
+        _patch_mp4_times(output_path, new_date)
+        return
+
+    _clone_file(input_path, output_path)
+    try:
+        _patch_mp4_times(output_path, new_date)
+    except Exception:
+        os.remove(output_path)
+        raise
+
+
+class FFmpegScheduler:
+    """
+    Run ffmpeg commands with a bounded number of processes in flight.
+
+    stderr is streamed line by line and only the last lines are kept for error
+    messages. Each job can time out, and cancel() kills every running job and
+    rejects queued ones.
+
+    Args:
+        max_procs (int): Maximum concurrent ffmpeg processes (None uses all CPUs)
+        timeout (float): Per-job timeout in seconds, None for no limit
+        stderr_lines (int): Number of stderr lines kept per job
+    """
+
+    def __init__(self, max_procs=None, timeout=None, stderr_lines=20):
+        self.timeout = timeout
+        self.stderr_lines = stderr_lines
+        self.counter = BatchCounter('jobs', 'failed', 'bytes')
+        self._slots = threading.BoundedSemaphore(max_procs or os.cpu_count() or 1)
+        self._lock = threading.Lock()
+        self._running = set()
+        self._cancelled = threading.Event()
+        self._first_start = None
+        self._last_end = None
+
+    def run(self, cmd, input_bytes=0):
+        """Run one ffmpeg command, raising if it fails, times out or is cancelled."""
+        with self._slots:
+            if self._cancelled.is_set():
+                raise RuntimeError("FFmpeg job cancelled")
+
+            proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, text=True, errors='replace')
+            with self._lock:
+                self._running.add(proc)
+                if self._first_start is None:
+                    self._first_start = time.perf_counter()
+
+            timer = None
+            timed_out = threading.Event()
+            if self.timeout:
+                def kill_on_timeout():
+                    timed_out.set()
+                    proc.kill()
+                timer = threading.Timer(self.timeout, kill_on_timeout)
+                timer.start()
+
+            stderr_tail = deque(maxlen=self.stderr_lines)
+            try:
+                for line in proc.stderr:
+                    stderr_tail.append(line.rstrip())
+                returncode = proc.wait()
+            finally:
+                if timer:
+                    timer.cancel()
+                proc.stderr.close()
+                with self._lock:
+                    self._running.discard(proc)
+                    self._last_end = time.perf_counter()
+
+        self.counter.increment('jobs')
+        if returncode == 0:
+            self.counter.increment('bytes', input_bytes)
+            return
+
+        self.counter.increment('failed')
+        if self._cancelled.is_set():
+            raise RuntimeError("FFmpeg job cancelled")
+        if timed_out.is_set():
+            raise TimeoutError(f"FFmpeg timed out after {self.timeout}s")
+        raise Exception("FFmpeg error: " + "\n".join(stderr_tail))
+
+    def cancel(self):
+        """Kill all running ffmpeg processes and reject jobs that have not started."""
+        self._cancelled.set()
+        with self._lock:
+            for proc in self._running:
+                proc.kill()
+
+    def throughput(self):
+        """Return (jobs, failed, megabytes, seconds) for the jobs run so far."""
+        with self._lock:
+            elapsed = (self._last_end or 0) - (self._first_start or 0)
+        counts = self.counter.as_dict()
+        return counts['jobs'], counts['failed'], counts['bytes'] / 1e6, elapsed
+
+
+def _remux_video_date(input_path, output_path, temp_path, new_date, scheduler=None):
+    """
+    Rewrite a video's creation_time with an ffmpeg stream-copy remux.
+
+    Returns:
+        str: A warning if the extra MP4 date tags could not be written, else None
+    """
+    # Format date for ffmpeg
+    ffmpeg_date = new_date.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Use ffmpeg to modify metadata
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostdin', '-y', '-i', input_path,
+        '-metadata', f'creation_time={ffmpeg_date}',
+        '-c', 'copy',  # Copy without re-encoding
+        '-map_metadata', '0',  # Copy all other metadata
+        temp_path
+    ]
+
+    # Run ffmpeg
+    if scheduler is None:
+        scheduler = FFmpegScheduler(max_procs=1)
+    scheduler.run(cmd, os.path.getsize(input_path))
+
+    # Move temp file to final destination
+    os.replace(temp_path, output_path)
+
+    # Try to update additional metadata with mutagen
+    try:
+        from mutagen.mp4 import MP4
+        video = MP4(output_path)
+        video["©day"] = str(new_date.year)
+        video["©tim"] = new_date.strftime('%H:%M:%S')
+        video["creation_time"] = [
+            new_date.strftime('%Y-%m-%dT%H:%M:%SZ')]
+        video.save()
+    except Exception as e:
+        return (f"Warning: Could not update additional metadata for "
+                f"{os.path.basename(input_path)}: {str(e)}")
+    return None
 
-    if successful > 0:
-        print(f"\nProcessing complete:")
-        print(f"Successfully processed: {successful} images")
-        print(f"Modified images saved to: {output_folder}")
-    if failed > 0:
-        print(
-            f"!!!!!!!!!!!!!!! Failed to process: {failed} images !!!!!!!!!!!!!!!")
 
+def _modify_video_date(input_path, output_path, new_date, timestamp, method, scheduler):
+    """
+    Set the creation date of one video.
 
-def modify_video_dates(input_folder, new_date_str, output_folder=None, name_addition=""):
+    Returns:
+        tuple: (remux_reason, warning). remux_reason is None if the headers were
+        patched, else why ffmpeg was used; warning is a problem that did not stop
+        the edit, or None
+    """
+    temp_path = output_path + '.temp.mp4'
+    remux_reason = warning = None
+    try:
+        if method == "patch":
+            try:
+                _patch_video_date(input_path, output_path, new_date)
+            except (ValueError, struct.error) as e:
+                remux_reason = str(e)
+        else:
+            remux_reason = "ffmpeg method"
+
+        if remux_reason is not None:
+            warning = _remux_video_date(input_path, output_path, temp_path, new_date, scheduler)
+
+        # Update file system timestamps
+        os.utime(output_path, (timestamp, timestamp))
+        return remux_reason, warning
+
+    except Exception:
+        # Clean up failed files, never the original
+        for path in [temp_path, output_path]:
+            if path != input_path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except:
+                    pass
+        raise
+
+
+def modify_video_dates(input_folder, new_date_str=None, output_folder=None, name_addition="",
+                       method="patch", in_place=False, workers=1, ffmpeg_timeout=None,
+                       duplicates=None, shift=None, date_map=None, monitor=None,
+                       durability="batch"):
     """
     Batch modify creation dates for MP4 videos in a folder, with special handling for GoPro files.
+
+    Every video gets new_date_str, its own date moved by shift, or its entry of
+    date_map; exactly one of the three must be given.
+
+    Args:
+        new_date_str (str, optional): New date as 'YYYY:MM:DD HH:MM:SS'
+        shift (timedelta, optional): Offset added to each video's movie header
+            creation time
+        date_map (str or dict, optional): CSV file with 'path' and 'date' columns,
+            or a dict of path -> datetime. Relative paths are resolved against
+            input_folder.
+        method (str): 'patch' rewrites the fixed-width header times of a reflink/copy
+            (or the original) and only remuxes with ffmpeg when that is not possible;
+            'ffmpeg' always remuxes
+        in_place (bool): Modify the original files instead of writing to output_folder
+        workers (int): Number of files, and so ffmpeg processes, in flight at once
+        ffmpeg_timeout (float, optional): Seconds before an ffmpeg remux is killed
+        duplicates (DuplicateIndex, optional): Skip videos whose content
+            duplicates another video of the folder
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+        durability (str): When outputs are synced to disk, see OutputWriter.
+            In-place header patches are written directly and only synced.
     """
+    monitor = monitor or BatchMonitor()
+    monitor.begin("modify_video_dates")
+    log = monitor.message
 
     # First, check if ffmpeg is available
-    try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True)
-    except FileNotFoundError:
-        print("Error: ffmpeg is not installed. Please install ffmpeg first.")
+    if method == "ffmpeg" and shutil.which('ffmpeg') is None:
+        log("Error: ffmpeg is not installed. Please install ffmpeg first.")
+        monitor.finish()
         return
 
-    # Validate the date format
-    try:
-        new_date = datetime.strptime(new_date_str, '%Y:%m:%d %H:%M:%S')
-        # Convert to Unix timestamp
-        timestamp = time.mktime(new_date.timetuple())
-        # Format date for ffmpeg
-        ffmpeg_date = new_date.strftime('%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        print("Error: Date must be in format 'YYYY:MM:DD HH:MM:SS'")
+    # Validate the dates
+    dates = _date_arguments(input_folder, new_date_str, shift, date_map, log)
+    if dates is None:
+        monitor.finish()
         return
+    new_date, date_map = dates
 
     # Setup output folder
-    if output_folder is None:
+    if in_place:
+        output_folder = input_folder
+        name_addition = ""
+    elif output_folder is None:
         output_folder = os.path.join(input_folder, "modified_videos")
 
     # Create output folder if it doesn't exist
     os.makedirs(output_folder, exist_ok=True)
 
     # Process all files in the folder
-    video_extensions = {'.mp4', '.MP4', '.m4v'}
-    successful = 0
-    failed = 0
-
-    for filename in os.listdir(input_folder):
-        if os.path.splitext(filename)[1] not in video_extensions:
-            continue
-
-        input_path = os.path.join(input_folder, filename)
-        output_path = os.path.join(output_folder, name_addition + filename)
-        temp_path = output_path + '.temp.mp4'
-
-        try:
-            # Use ffmpeg to modify metadata
-            cmd = [
-                'ffmpeg', '-i', input_path,
-                '-metadata', f'creation_time={ffmpeg_date}',
-                '-c', 'copy',  # Copy without re-encoding
-                '-map_metadata', '0',  # Copy all other metadata
-                temp_path
-            ]
-
-            # Run ffmpeg
-            result = subprocess.run(cmd, capture_output=True, text=True)
-
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg error: {result.stderr}")
-
-            # Move temp file to final destination
-            if os.path.exists(output_path):
-                os.remove(output_path)
-            os.rename(temp_path, output_path)
-
-            # Update file system timestamps
-            os.utime(output_path, (timestamp, timestamp))
-
-            # Try to update additional metadata with mutagen
-            try:
-                video = MP4(output_path)
-                video["©day"] = str(new_date.year)
-                video["©tim"] = new_date.strftime('%H:%M:%S')
-                video["creation_time"] = [
-                    new_date.strftime('%Y-%m-%dT%H:%M:%SZ')]
-                video.save()
-            except Exception as e:
-                print(
-                    f"Warning: Could not update additional metadata for {filename}: {str(e)}")
-
-            successful += 1
-
-        except Exception as e:
-            failed += 1
-            print(f"Failed to process {filename}: {str(e)}")
-            # Clean up failed files
-            for path in [temp_path, output_path]:
-                if os.path.exists(path):
-                    try:
-                        os.remove(path)
-                    except:
-                        pass
+    scheduler = FFmpegScheduler(max_procs=workers, timeout=ffmpeg_timeout)
+    counter = BatchCounter('successful', 'failed', 'duplicates', 'undated')
+    writer = OutputWriter(durability, folder=output_folder)
+
+    entries = monitor.timed('scan', scan_files(input_folder, video_extensions,
+                                               ignore_case=False))
+    if os.path.realpath(output_folder) == os.path.realpath(input_folder):
+        # Outputs and temp files land in the folder being scanned: list it before writing
+        entries = list(entries)
+    entries = _skip_duplicates(entries, duplicates, counter, log)
+
+    def read_dates(paths):
+        with monitor.stage('metadata'):
+            return _mp4_creation_dates(paths)
+
+    jobs = (
+        # File system timestamps use the Unix epoch
+        (entry.path, writer.stage(os.path.join(output_folder, name_addition + entry.name),
+                                  entry.path),
+         date, time.mktime(date.timetuple()), method, scheduler)
+        for entry, date in _new_dates(entries, new_date, shift, date_map, read_dates,
+                                      counter, log)
+    )
+
+    results = run_batch(_TimedCall(_modify_video_date), jobs, workers,
+                        on_interrupt=scheduler.cancel)
+    try:
+        for job, timed, error in results:
+            filename = os.path.basename(job[0])
+            if error is not None:
+                writer.discard(job[1])
+                counter.increment('failed')
+                monitor.file_done(job[0], 'failed')
+                log(f"Failed to process {filename}: {str(error)}")
+                continue
+            writer.commit(job[1])
+            (remux_reason, warning), seconds = timed
+            if remux_reason is not None and method == "patch":
+                log(f"Remuxed {filename} with ffmpeg ({remux_reason})")
+            if warning is not None:
+                log(warning)
+            counter.increment('successful')
+            monitor.add_stage('patch' if remux_reason is None else 'remux', seconds)
+            monitor.file_done(job[0], seconds=seconds)
+    finally:
+        # Stops the jobs still running before their outputs are cleaned up
+        results.close()
+        _close_writer(writer, counter, 'successful', 'failed', monitor)
+
+    successful = counter['successful']
+    failed = counter['failed']
     if successful > 0:
-        print("\nProcessing complete:")
-        print(f"Successfully processed: {successful} videos")
-        print(f"Modified videos saved to: {output_folder}")
+        log("\nProcessing complete:")
+        log(f"Successfully processed: {successful} videos")
+        log(f"Modified videos saved to: {output_folder}")
+    if counter['duplicates'] > 0:
+        log(f"Skipped (duplicate content): {counter['duplicates']} videos")
+    if counter['undated'] > 0:
+        log(f"Skipped (no new date): {counter['undated']} videos")
+    jobs_run, jobs_failed, megabytes, seconds = scheduler.throughput()
+    if jobs_run > 0:
+        log(f"FFmpeg remuxes: {jobs_run} ({jobs_failed} failed), "
+            f"{megabytes:.1f} MB in {seconds:.1f}s ({megabytes / max(seconds, 1e-9):.1f} MB/s)")
     if failed > 0:
-        print(
-            f"!!!!!!!!!!!!!!! Failed to process: {failed} videos !!!!!!!!!!!!!!!")
+        log(f"!!!!!!!!!!!!!!! Failed to process: {failed} videos !!!!!!!!!!!!!!!")
+    monitor.finish()
 
 
-def filter_images_by_year(input_folder, target_year, keep_folder=None, move_folder=None):
+def filter_images_by_year(input_folder, target_year, keep_folder=None, move_folder=None,
+                          workers=1, pool="thread", index=None, recursive=False,
+                          dry_run=False, plan_path=None, strategy="copy", monitor=None,
+                          prefetch=None):
     """
     Filter images based on their EXIF date. Keep files from target year, move others.
 
+    Files are first classified into a plan, which is then executed.
+
     Args:
         input_folder (str): Path to folder containing images
         target_year (int): Target year to filter by
         keep_folder (str, optional): Path to folder for keeping matched files
         move_folder (str, optional): Path to folder for moving unmatched files
+        workers (int): Number of parallel workers (None uses all CPUs)
+        pool (str): 'thread' or 'process' worker pool
+        index (MetadataIndex, optional): Cache of previously extracted dates
+        recursive (bool): Also filter images in subfolders of input_folder. Their
+            subfolders are recreated under the output folders.
+        dry_run (bool): Only plan the copies, don't touch any file
+        plan_path (str, optional): Write the plan to this .json or .csv file
+        strategy (str): How files are placed in the output folders: 'copy',
+            'hardlink', 'reflink', 'symlink' or 'move'. Links fall back to a
+            copy where the filesystem does not support them.
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+        prefetch (Prefetcher, optional): Read the headers of the next images
+            ahead while one is parsed, to hide storage latency
+
+    Returns:
+        list: The planned operations
     """
+    import numpy as np
+    if strategy not in PLAN_ACTIONS:
+        raise ValueError(f"Unknown strategy: {strategy}")
 
     # Setup output folders
     root_folder = os.path.dirname(input_folder)
@@ -255,72 +2403,89 @@ def filter_images_by_year(input_folder, target_year, keep_folder=None, move_fold
         move_folder = os.path.join(root_folder, "other_years")
 
     # Create output folders if they don't exist
-    os.makedirs(keep_folder, exist_ok=True)
-    os.makedirs(move_folder, exist_ok=True)
-
-    # Process all files in the folder
-
-    kept = 0
-    moved = 0
-    failed = 0
-
-    for filename in os.listdir(input_folder):
-        if os.path.splitext(filename.lower())[1] not in image_extensions:
+    if not dry_run:
+        os.makedirs(keep_folder, exist_ok=True)
+        os.makedirs(move_folder, exist_ok=True)
+
+    # Classify all files in the folder
+    monitor = monitor or BatchMonitor()
+    monitor.begin("filter_images_by_year")
+    log = monitor.message
+    counter = BatchCounter('kept', 'moved', 'failed')
+    plan = []
+
+    entries = monitor.timed('scan', scan_files(input_folder, image_extensions, recursive,
+                                               exclude=[keep_folder, move_folder]))
+    dates = resolve_capture_dates(entries, workers, pool, index, monitor=monitor,
+                                  prefetch=prefetch)
+    years = capture_date_buckets(dates['date'], 'Y')
+    keep = years == np.datetime64(str(target_year), 'Y')
+
+    for input_path, year, is_kept, error in zip(dates['path'], years, keep, dates['error']):
+        filename = os.path.basename(input_path)
+        if error is not None:
+            counter.increment('failed')
+            log(f"Failed to process {filename}: {error}")
             continue
 
-        input_path = os.path.join(input_folder, filename)
-
-        try:
-            # Load EXIF data
-            exif_dict = piexif.load(input_path)
-
-            # Try to get original date from EXIF
-            date_str = None
-            if "Exif" in exif_dict and piexif.ExifIFD.DateTimeOriginal in exif_dict["Exif"]:
-                date_str = exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal].decode(
-                    'utf-8')
-            elif "0th" in exif_dict and piexif.ImageIFD.DateTime in exif_dict["0th"]:
-                date_str = exif_dict["0th"][piexif.ImageIFD.DateTime].decode(
-                    'utf-8')
-
-            if date_str:
-                file_year = datetime.strptime(
-                    date_str, '%Y:%m:%d %H:%M:%S').year
-
-                # Determine destination based on year
-                if file_year == target_year:
-                    dest_folder = keep_folder
-                    kept += 1
-                else:
-                    print(f"Moved {filename} (Year: {file_year})")
-                    dest_folder = move_folder
-                    moved += 1
-
-                # Copy file to appropriate folder
-                shutil.copy2(input_path, os.path.join(dest_folder, filename))
-
-            else:
-                # If no date found, move to other years folder
-                shutil.copy2(input_path, os.path.join(move_folder, filename))
-                moved += 1
-                print(f"No date found in {filename}, moved to other years")
-
-        except Exception as e:
-            failed += 1
-            print(f"Failed to process {filename}: {str(e)}")
-
-    print(f"\nProcessing complete:")
-    print(f"Files from {target_year}: {kept}")
-    print(f"Files from other years: {moved}")
-    print(f"Failed to process: {failed}")
-    print(f"Matching files saved to: {keep_folder}")
-    print(f"Other files saved to: {move_folder}")
-
-
-def filter_videos_by_year(input_folder, target_year, keep_folder=None, move_folder=None):
+        if is_kept:
+            dest_folder = keep_folder
+            counter.increment('kept')
+        elif np.isnat(year):
+            # If no date found, move to other years folder
+            dest_folder = move_folder
+            counter.increment('moved')
+            log(f"No date found in {filename}, moved to other years")
+        else:
+            dest_folder = move_folder
+            counter.increment('moved')
+            log(f"Moved {filename} (Year: {year})")
+
+        # Copy file to appropriate folder, keeping the subfolders of a recursive scan
+        plan.append({'action': strategy, 'source': input_path,
+                     'destination': _output_path(dest_folder, input_folder, input_path)})
+
+    with monitor.stage('execute'):
+        counter.increment('failed', _finish_plan(plan, dry_run, plan_path, workers, log))
+
+    log(f"\nProcessing complete:")
+    log(f"Files from {target_year}: {counter['kept']}")
+    log(f"Files from other years: {counter['moved']}")
+    log(f"Failed to process: {counter['failed']}")
+    log(f"Matching files saved to: {keep_folder}")
+    log(f"Other files saved to: {move_folder}")
+    monitor.finish()
+    return plan
+
+
+def filter_videos_by_year(input_folder, target_year, keep_folder=None, move_folder=None,
+                          index=None, recursive=False, dry_run=False, plan_path=None,
+                          strategy="copy", monitor=None, prefetch=None):
     """
     Filter videos based on their creation date. Keep files from target year, move others.
+
+    Files are first classified into a plan, which is then executed.
+
+    Args:
+        index (MetadataIndex, optional): Cache of previously extracted dates
+        recursive (bool): Also filter videos in subfolders of input_folder. Their
+            subfolders are recreated under the output folders.
+        dry_run (bool): Only plan the copies, don't touch any file
+        plan_path (str, optional): Write the plan to this .json or .csv file
+        strategy (str): How files are placed in the output folders: 'copy',
+            'hardlink', 'reflink', 'symlink' or 'move'. Links fall back to a
+            copy where the filesystem does not support them.
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+        prefetch (Prefetcher, optional): Read the headers of the next videos
+            ahead while one is parsed, to hide storage latency
+
+    Returns:
+        list: The planned operations
     """
+    import numpy as np
+    if strategy not in PLAN_ACTIONS:
+        raise ValueError(f"Unknown strategy: {strategy}")
 
     # Setup output folders
     root_folder = os.path.dirname(input_folder)
@@ -330,112 +2495,451 @@ def filter_videos_by_year(input_folder, target_year, keep_folder=None, move_fold
         move_folder = os.path.join(root_folder, "other_years")
 
     # Create output folders if they don't exist
-    os.makedirs(keep_folder, exist_ok=True)
-    os.makedirs(move_folder, exist_ok=True)
-
-    # Process all files in the folder
+    if not dry_run:
+        os.makedirs(keep_folder, exist_ok=True)
+        os.makedirs(move_folder, exist_ok=True)
+
+    # Classify all files in the folder
+    monitor = monitor or BatchMonitor()
+    monitor.begin("filter_videos_by_year")
+    log = monitor.message
     kept = 0
     moved = 0
     failed = 0
-
-    for filename in os.listdir(input_folder):
-        if os.path.splitext(filename)[1] not in video_extensions:
+    plan = []
+
+    # Fall back to the file modification time when there is no metadata date
+    entries = monitor.timed('scan', scan_files(
+        input_folder, video_extensions, recursive, ignore_case=False,
+        exclude=[keep_folder, move_folder]))
+    dates = resolve_capture_dates(entries, index=index, mtime_fallback=True, monitor=monitor,
+                                  prefetch=prefetch)
+    years = capture_date_buckets(dates['date'], 'Y')
+    keep = years == np.datetime64(str(target_year), 'Y')
+
+    for input_path, year, is_kept, source, error in zip(
+            dates['path'], years, keep, dates['source'], dates['error']):
+        filename = os.path.basename(input_path)
+        if error is not None:
+            failed += 1
+            log(f"Failed to process {filename}: {error}")
             continue
 
-        input_path = os.path.join(input_folder, filename)
+        if source == 'mtime':
+            log(f"No metadata date found for {filename}, using file modification date")
 
-        try:
-            # Try to get date from MP4 metadata
-            video = MP4(input_path)
-            file_year = None
-
-            # Check various metadata fields for date
-            if 'creation_time' in video:
-                date_str = video['creation_time'][0]
-                file_year = datetime.strptime(
-                    date_str, '%Y-%m-%dT%H:%M:%SZ').year
-            elif '©day' in video:
-                file_year = int(video['©day'][0])
-
-            # If no date in metadata, try file modification time
-            if file_year is None:
-                file_year = datetime.fromtimestamp(
-                    os.path.getmtime(input_path)).year
-                print(
-                    f"No metadata date found for {filename}, using file modification date")
-
-            # Determine destination based on year
-            if file_year == target_year:
-                dest_folder = keep_folder
-                kept += 1
-            else:
-                dest_folder = move_folder
-                moved += 1
+        # Determine destination based on year
+        if is_kept:
+            dest_folder = keep_folder
+            kept += 1
+        else:
+            dest_folder = move_folder
+            moved += 1
 
-            # Copy file to appropriate folder
-            shutil.copy2(input_path, os.path.join(dest_folder, filename))
-            print(f"Processed {filename} (Year: {file_year})")
+        # Copy file to appropriate folder, keeping the subfolders of a recursive scan
+        plan.append({'action': strategy, 'source': input_path,
+                     'destination': _output_path(dest_folder, input_folder, input_path)})
+        log(f"Processed {filename} (Year: {year})")
 
-        except Exception as e:
-            failed += 1
-            print(f"Failed to process {filename}: {str(e)}")
+    with monitor.stage('execute'):
+        failed += _finish_plan(plan, dry_run, plan_path, log=log)
 
-    print(f"\nProcessing complete:")
-    print(f"Files from {target_year}: {kept}")
-    print(f"Files from other years: {moved}")
-    print(f"Failed to process: {failed}")
-    print(f"Matching files saved to: {keep_folder}")
-    print(f"Other files saved to: {move_folder}")
+    log(f"\nProcessing complete:")
+    log(f"Files from {target_year}: {kept}")
+    log(f"Files from other years: {moved}")
+    log(f"Failed to process: {failed}")
+    log(f"Matching files saved to: {keep_folder}")
+    log(f"Other files saved to: {move_folder}")
+    monitor.finish()
+    return plan
 
 
-def get_heic_creation_date(image_path):
+def get_heic_creation_date(image_path, index=None):
     """Extract creation date from HEIC file's EXIF data."""
     try:
+        if index is not None:
+            return index.lookup(image_path, _image_metadata)['capture_date']
+        _register_heif_opener_once()
         with Image.open(image_path) as img:
-            exif_dict = piexif.load(img.info.get('exif', b''))
-            if exif_dict.get('Exif') and piexif.ExifIFD.DateTimeOriginal in exif_dict['Exif']:
-                date_str = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode(
-                    'utf-8')
-                return datetime.strptime(date_str, '%Y:%m:%d %H:%M:%S')
+            exif = img.info.get('exif')
+            if exif:
+                return _exif_tiff_date(exif, (piexif.ExifIFD.DateTimeOriginal,))
     except Exception as e:
         print(f"Warning: Could not extract creation date: {e}")
     return None
 
 
-def convert_heic_to_jpg(input_path, output_path=None):
-    """Convert HEIC file to JPG while preserving creation date."""
-    # Register HEIF opener
-    register_heif_opener()
+_heif_opener_registered = False
 
-    # If output path is not specified, create one
-    if output_path is None:
-        output_path = os.path.splitext(input_path)[0] + '.jpg'
 
-    try:
-        # Get creation date before conversion
-        creation_date = get_heic_creation_date(input_path)
+def _register_heif_opener_once():
+    """Register the HEIF opener the first time it is needed in this process."""
+    global _heif_opener_registered
+    if not _heif_opener_registered:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+        _heif_opener_registered = True
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds per named stage."""
+
+    def __init__(self):
+        self.totals = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + \
+                time.perf_counter() - start
+
+    def merge(self, totals):
+        for name, seconds in totals.items():
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.totals.items())
+
+
+class BatchMonitor:
+    """
+    Structured progress, throughput and latency reporting for batch runs.
+
+    A batch calls begin(), then file_done() for every file and finish() at the
+    end. Each event is a dict handed to every sink: 'start', 'progress' (at most
+    once per progress_every seconds), 'file' (only with file_events), 'message'
+    (the lines the batch used to print) and 'summary'. Progress and summary
+    events carry file counts, bytes, files/s, MB/s, p50/p99 per-file latency
+    and seconds per stage, summed over workers.
+
+    Args:
+        sinks (list, optional): Callables receiving each event, print_sink by
+            default. See also JsonLinesSink.
+        progress_every (float): Seconds between progress events
+        file_events (bool): Also emit an event for every file
+    """
+
+    def __init__(self, sinks=None, progress_every=10.0, file_events=False):
+        self.sinks = list(sinks) if sinks is not None else [print_sink]
+        self.progress_every = progress_every
+        self.file_events = file_events
+        self.batch = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.timer = StageTimer()
+        self.counts = {}
+        self.bytes = 0
+        self.latencies = []
+        self._start = self._last_progress = time.perf_counter()
+
+    def _emit(self, event):
+        event = dict(event, batch=self.batch, time=time.time())
+        for sink in self.sinks:
+            sink(event)
+
+    def begin(self, batch):
+        """Reset the statistics for a new batch and emit its 'start' event."""
+        with self._lock:
+            self.batch = batch
+            self._reset()
+        self._emit({'event': 'start'})
+
+    def message(self, text):
+        """Report a human-readable line, such as why a file failed."""
+        self._emit({'event': 'message', 'text': text})
+
+    def stage(self, name):
+        """Context manager adding the time spent in its block to a stage."""
+        return self.timer.stage(name)
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.timer.merge({name: seconds})
+
+    def timed(self, name, iterable):
+        """Yield from iterable, adding the time spent producing items to a stage."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_stage(name, time.perf_counter() - start)
+                return
+            self.add_stage(name, time.perf_counter() - start)
+            yield item
+
+    def file_done(self, path, status='ok', seconds=None, size=None):
+        """
+        Record one finished file.
+
+        Args:
+            path (str): The input file
+            status (str): 'ok', 'failed' or 'skipped'
+            seconds (float, optional): Time spent on the file
+            size (int, optional): Bytes processed, the input's size by default
+        """
+        if size is None and status == 'ok':
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+        now = time.perf_counter()
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.bytes += size or 0
+            if seconds is not None:
+                self.latencies.append(seconds)
+            progress = now - self._last_progress >= self.progress_every
+            if progress:
+                self._last_progress = now
+
+        if self.file_events:
+            self._emit({'event': 'file', 'path': path, 'status': status,
+                        'seconds': seconds, 'bytes': size})
+        if progress:
+            self._emit(dict(self.stats(), event='progress'))
+
+    def stats(self):
+        """Return the statistics of the current batch so far."""
+        import numpy as np
+        with self._lock:
+            elapsed = time.perf_counter() - self._start
+            files = sum(self.counts.values())
+            latencies = np.array(self.latencies)
+            p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (None, None)
+            return {
+                'files': files,
+                'counts': dict(self.counts),
+                'bytes': self.bytes,
+                'elapsed': elapsed,
+                'files_per_s': files / elapsed if elapsed > 0 else 0.0,
+                'mb_per_s': self.bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+                'latency_p50': float(p50) if p50 is not None else None,
+                'latency_p99': float(p99) if p99 is not None else None,
+                'stages': dict(self.timer.totals),
+            }
+
+    def finish(self):
+        """Emit the 'summary' event of the batch and return its statistics."""
+        stats = self.stats()
+        self._emit(dict(stats, event='summary'))
+        return stats
+
+
+def print_sink(event):
+    """BatchMonitor sink printing messages, progress lines and the summary."""
+    kind = event['event']
+    if kind == 'message':
+        print(event['text'])
+    elif kind in ('progress', 'summary') and event['files']:
+        line = (f"{event['files']} files in {event['elapsed']:.1f}s "
+                f"({event['files_per_s']:.1f} files/s, {event['mb_per_s']:.1f} MB/s")
+        if event['latency_p50'] is not None:
+            line += (f", latency p50 {event['latency_p50'] * 1000:.1f} ms"
+                     f" p99 {event['latency_p99'] * 1000:.1f} ms")
+        line += ")"
+        if kind == 'progress':
+            print(f"[{event['batch']}] {line}")
+        else:
+            print(f"Throughput: {line}")
+            if event['stages']:
+                print("Stage time (summed over workers): " + ", ".join(
+                    f"{name} {seconds:.2f}s" for name, seconds in event['stages'].items()))
+
+
+class JsonLinesSink:
+    """
+    BatchMonitor sink appending every event to a file as one JSON line.
+
+    Lines are flushed as they are written, so a long run can be followed with
+    tail -f or loaded while it is still going.
+
+    Args:
+        path (str): Path to the JSON lines file
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
 
-        # Open and convert image
-        with Image.open(input_path) as img:
-            # Preserve EXIF data if available
-            exif_dict = piexif.load(img.info.get('exif', b''))
+    def __call__(self, event):
+        with self._lock:
+            self._file.write(json.dumps(event, default=str) + "\n")
+            self._file.flush()
 
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConversionProfile:
+    """
+    Output settings for the HEIC and PNG converters.
+
+    Args:
+        format (str): 'JPEG', 'WEBP' or 'AVIF'
+        quality (int): Encoder quality, 1-100
+        subsampling (str, optional): Chroma subsampling such as '4:4:4' or
+            '4:2:0'; the encoder's default when None
+        optimize (bool): Optimize JPEG Huffman tables, or use WebP's slowest and
+            smallest method
+        progressive (bool): Write progressive JPEGs
+        max_size (int, optional): Downscale so neither side exceeds this many
+            pixels, decoding at reduced size where the decoder supports draft()
+    """
+
+    EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'AVIF': '.avif'}
+
+    def __init__(self, format='JPEG', quality=95, subsampling=None, optimize=False,
+                 progressive=False, max_size=None):
+        self.format = format.upper()
+        if self.format not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported output format: {format}")
+        self.quality = quality
+        self.subsampling = subsampling
+        self.optimize = optimize
+        self.progressive = progressive
+        self.max_size = max_size
+
+    @property
+    def extension(self):
+        return self.EXTENSIONS[self.format]
+
+    def save_options(self, exif_bytes=None):
+        """Keyword arguments for Image.save in this profile's format."""
+        options = {'quality': self.quality}
+        if exif_bytes:
+            options['exif'] = exif_bytes
+        if self.subsampling is not None and self.format != 'WEBP':
+            options['subsampling'] = self.subsampling
+        if self.format == 'JPEG':
+            options['optimize'] = self.optimize
+            options['progressive'] = self.progressive
+        elif self.format == 'WEBP' and self.optimize:
+            options['method'] = 6
+        return options
+
+    def __repr__(self):
+        return (f"ConversionProfile(format={self.format!r}, quality={self.quality}, "
+                f"subsampling={self.subsampling!r}, optimize={self.optimize}, "
+                f"progressive={self.progressive}, max_size={self.max_size})")
+
+    def __eq__(self, other):
+        return isinstance(other, ConversionProfile) and repr(self) == repr(other)
+
+
+CONVERSION_PROFILES = {
+    # Largest and slowest: what HEIC conversion always used
+    'archive': ConversionProfile(quality=100),
+    # What PNG conversion always used
+    'high': ConversionProfile(quality=95),
+    'compact': ConversionProfile(quality=85, subsampling='4:2:0', optimize=True,
+                                 progressive=True),
+    'web': ConversionProfile('WEBP', quality=80, max_size=2048),
+}
+
+
+def _conversion_profile(profile, default):
+    """Resolve None, a CONVERSION_PROFILES name or a ConversionProfile."""
+    if profile is None:
+        return CONVERSION_PROFILES[default]
+    if isinstance(profile, str):
+        return CONVERSION_PROFILES[profile]
+    return profile
+
+
+def _downscale(img, profile, timer):
+    """Shrink a loaded image in place to fit the profile's max_size."""
+    if profile.max_size is not None and max(img.size) > profile.max_size:
+        with timer.stage('resize'):
+            img.thumbnail((profile.max_size, profile.max_size), Image.LANCZOS)
+
+
+def _convert_heic_to_jpg(input_path, output_path, timer, profile=None):
+    """
+    Convert one HEIC file to JPG, recording decode/encode/metadata time in timer.
+
+    Returns:
+        str: A warning if the creation date could not be read, else None
+    """
+    _register_heif_opener_once()
+    profile = _conversion_profile(profile, 'archive')
+
+    # Open and convert image
+    with timer.stage('decode'):
+        img = Image.open(input_path)
+        if profile.max_size is not None:
+            # Decode at reduced size when the decoder supports it
+            img.draft('RGB', (profile.max_size, profile.max_size))
+    try:
+        with timer.stage('metadata'):
+            # Preserve EXIF data and get creation date before conversion
+            exif = img.info.get('exif', b'')
+            exif_dict = piexif.load(exif)
+            creation_date = warning = None
+            if exif:
+                try:
+                    creation_date = _exif_tiff_date(
+                        exif, (piexif.ExifIFD.DateTimeOriginal,))
+                except Exception as e:
+                    warning = (f"Warning: Could not extract creation date of "
+                               f"{os.path.basename(input_path)}: {e}")
+
+        with timer.stage('decode'):
+            img.load()
             # Convert to RGB if necessary
             if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
+                rgb = img.convert('RGB')
+                img.close()
+                img = rgb
+        _downscale(img, profile, timer)
+
+        # Save with original EXIF data
+        with timer.stage('encode'):
+            exif_bytes = piexif.dump(exif_dict) if exif_dict else None
+            img.save(output_path, profile.format, **profile.save_options(exif_bytes))
+    finally:
+        img.close()
+
+    # If we found a creation date, update the file's modification time
+    if creation_date:
+        timestamp = creation_date.timestamp()
+        os.utime(output_path, (timestamp, timestamp))
+    return warning
+
+
+def convert_heic_to_jpg(input_path, output_path=None, profile=None, durability="batch"):
+    """
+    Convert HEIC file to JPG while preserving creation date.
 
-            # Save as JPG with original EXIF data
-            if exif_dict:
-                exif_bytes = piexif.dump(exif_dict)
-                img.save(output_path, 'JPEG', quality=100, exif=exif_bytes)
-            else:
-                img.save(output_path, 'JPEG', quality=100)
+    Args:
+        profile (ConversionProfile or str, optional): Output settings, or the name
+            of one of CONVERSION_PROFILES. Defaults to 'archive' (JPEG quality 100).
+        durability (str): Whether the output is synced to disk, see OutputWriter
+    """
+    profile = _conversion_profile(profile, 'archive')
 
-        # If we found a creation date, update the file's modification time
-        if creation_date:
-            timestamp = creation_date.timestamp()
-            os.utime(output_path, (timestamp, timestamp))
+    # If output path is not specified, create one
+    if output_path is None:
+        output_path = os.path.splitext(input_path)[0] + profile.extension
 
+    try:
+        warning = _convert_one(_convert_heic_to_jpg, input_path, output_path, profile,
+                               durability)
+        if warning is not None:
+            print(warning)
         return True
 
     except Exception as e:
@@ -443,90 +2947,251 @@ def convert_heic_to_jpg(input_path, output_path=None):
         return False
 
 
-def batch_convert_heic_to_jpg(input_folder, output_folder=None):
-    """Convert all HEIC files in a folder to JPG."""
+def _convert_one(convert, input_path, output_path, profile, durability):
+    """
+    Run one converter through a temp file that is renamed into place when complete.
+
+    Returns:
+        str: The converter's warning, or None
+    """
+    with OutputWriter(durability) as writer:
+        temp_path = writer.stage(output_path, input_path)
+        try:
+            warning = convert(input_path, temp_path, StageTimer(), profile)
+        except Exception:
+            writer.discard(temp_path)
+            raise
+        writer.commit(temp_path)
+    if writer.errors:
+        raise writer.errors[0][1]
+    return warning
+
+
+def _run_conversion(convert, input_path, output_path, profile):
+    """Run one converter in a worker and return (per-stage timings, warning or None)."""
+    timer = StageTimer()
+    warning = convert(input_path, output_path, timer, profile)
+    return timer.totals, warning
+
+
+def _batch_convert(convert, input_folder, output_folder, input_extension, workers, pool,
+                   incremental=False, duplicates=None, monitor=None, profile=None,
+                   default_profile='archive', durability="batch"):
+    """
+    Run a converter over every matching file of a folder on a worker pool.
+
+    Each worker holds at most one decoded image at a time, so peak memory is
+    bounded by ``workers`` decoded frames. With incremental, outputs recorded in
+    the output folder's manifest for an unchanged source are skipped; with a
+    duplicates index, so are sources whose content another source already has.
+    Outputs are written to temp files and committed through an OutputWriter.
+    """
+    profile = _conversion_profile(profile, default_profile)
+    monitor = monitor or BatchMonitor()
+    monitor.begin(f"batch_convert{input_extension.replace('.', '_')}_to_jpg")
+    log = monitor.message
+    counter = BatchCounter('success', 'fail', 'skipped', 'duplicates')
+    manifest = CompletionManifest(os.path.join(
+        output_folder, MANIFEST_FILENAME)) if incremental else None
+    settings = convert.__name__
+    if profile != CONVERSION_PROFILES[default_profile]:
+        settings += f":{profile!r}"
+    writer = OutputWriter(durability, folder=output_folder)
+
+    jobs = (
+        (convert, entry.path,
+         os.path.join(output_folder, os.path.splitext(entry.name)[0] + profile.extension),
+         profile)
+        for entry in _skip_duplicates(
+            monitor.timed('scan', scan_files(input_folder, {input_extension})),
+            duplicates, counter, log)
+    )
+    jobs = _skip_completed(jobs, manifest, settings, counter, input_index=1)
+    jobs = ((convert, input_path, writer.stage(output_path, input_path), profile)
+            for convert, input_path, output_path, profile in jobs)
+
+    results = run_batch(_TimedCall(_run_conversion), jobs, workers, pool)
+    try:
+        for job, timed, error in results:
+            if error is None:
+                counter.increment('success')
+                (totals, warning), seconds = timed
+                if warning is not None:
+                    log(warning)
+                for stage, stage_seconds in totals.items():
+                    monitor.add_stage(stage, stage_seconds)
+                monitor.file_done(job[1], seconds=seconds)
+                # Recorded once the output is in place
+                writer.commit(job[2], None if manifest is None else (
+                    lambda output_path, job=job: manifest.record(job[1], output_path, settings)))
+            else:
+                writer.discard(job[2])
+                log(f"Error converting {job[1]}: {error}")
+                counter.increment('fail')
+                monitor.file_done(job[1], 'failed')
+    finally:
+        # Stops the jobs still running before their outputs are cleaned up
+        results.close()
+        _close_writer(writer, counter, 'success', 'fail', monitor)
+        if manifest is not None:
+            manifest.close()
+
+    log(f"\nConversion complete!")
+    log(f"Successfully converted: {counter['success']} files")
+    log(f"Failed conversions: {counter['fail']} files")
+    if counter['skipped'] > 0:
+        log(f"Skipped (already up to date): {counter['skipped']} files")
+    if counter['duplicates'] > 0:
+        log(f"Skipped (duplicate content): {counter['duplicates']} files")
+    monitor.finish()
+
+
+def batch_convert_heic_to_jpg(input_folder, output_folder=None, workers=1, pool="process",
+                             incremental=False, duplicates=None, monitor=None, profile=None,
+                             durability="batch"):
+    """
+    Convert all HEIC files in a folder to JPG.
+
+    Args:
+        workers (int): Number of parallel workers (None uses all CPUs)
+        pool (str): 'process' or 'thread' worker pool
+        incremental (bool): Skip files already converted from an unchanged source
+        duplicates (DuplicateIndex, optional): Skip files whose content
+            duplicates another file of the folder
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+        profile (ConversionProfile or str, optional): Output settings, or the name
+            of one of CONVERSION_PROFILES
+        durability (str): When outputs are synced to disk, see OutputWriter
+    """
     if output_folder is None:
         output_folder = input_folder
 
     if not os.path.exists(output_folder):
         os.makedirs(output_folder, exist_ok=True)
 
-    success_count = 0
-    fail_count = 0
-
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith('.heic'):
-            input_path = os.path.join(input_folder, filename)
-            output_path = os.path.join(output_folder,
-                                       os.path.splitext(filename)[0] + '.jpg')
-
-            if convert_heic_to_jpg(input_path, output_path):
-                success_count += 1
-            else:
-                fail_count += 1
-
-    print(f"\nConversion complete!")
-    print(f"Successfully converted: {success_count} files")
-    print(f"Failed conversions: {fail_count} files")
+    _batch_convert(_convert_heic_to_jpg, input_folder, output_folder, '.heic', workers, pool,
+                   incremental, duplicates, monitor, profile, 'archive', durability)
 
 
 def get_png_creation_date(image_path):
     """Extract creation date from PNG file's EXIF data."""
     try:
-        with Image.open(image_path) as img:
-            if 'exif' in img.info:
-                exif_dict = piexif.load(img.info['exif'])
-                if exif_dict.get('Exif') and piexif.ExifIFD.DateTimeOriginal in exif_dict['Exif']:
-                    date_str = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode(
-                        'utf-8')
-                    return datetime.strptime(date_str, '%Y:%m:%d %H:%M:%S')
+        return _png_creation_date(image_path)
     except Exception as e:
         print(f"Warning: Could not extract creation date: {e}")
     return None
 
 
-def convert_png_to_jpg(input_path, output_path=None):
-    """Convert PNG file to JPG while preserving creation date."""
-    # If output path is not specified, create one
-    if output_path is None:
-        output_path = os.path.splitext(input_path)[0] + '.jpg'
+def _png_creation_date(image_path):
+    """Return the EXIF creation date of a PNG file or None, raising if it is unreadable."""
+    exif = _read_png_exif(image_path)
+    if exif is None:
+        with Image.open(image_path) as img:
+            exif = img.info.get('exif')
+    if exif:
+        return _exif_tiff_date(exif, (piexif.ExifIFD.DateTimeOriginal,))
+    return None
 
-    try:
-        # Get creation date before conversion
-        creation_date = get_png_creation_date(input_path)
 
-        # Open and convert image
-        with Image.open(input_path) as img:
+def _flatten_alpha(img, background=(255, 255, 255)):
+    """
+    Flatten an image onto a solid background as RGB.
+
+    RGBA and LA images are pasted with themselves as the mask, so their alpha
+    band is read in place instead of being split out into separate images, and
+    peak memory stays at the decoded frame plus the RGB output. Palette and
+    L/RGB images with a transparent colour are expanded to RGBA first.
+
+    Returns:
+        Image: An RGB image, which is img itself if it had nothing to flatten
+    """
+    if img.mode in ('RGBA', 'LA'):
+        source = img
+    elif img.mode in ('PA', 'La', 'RGBa') or 'transparency' in img.info:
+        source = img.convert('RGBA')
+    elif img.mode == 'RGB':
+        return img
+    else:
+        return img.convert('RGB')
+
+    flat = Image.new('RGB', img.size, background)
+    flat.paste(source, mask=source)
+    if source is not img:
+        source.close()
+    return flat
+
+
+def _convert_png_to_jpg(input_path, output_path, timer, profile=None):
+    """
+    Convert one PNG file to JPG, recording decode/encode/metadata time in timer.
+
+    Returns:
+        str: A warning if the creation date could not be read, else None
+    """
+    profile = _conversion_profile(profile, 'high')
+
+    # Get creation date before conversion
+    creation_date = warning = None
+    with timer.stage('metadata'):
+        try:
+            creation_date = _png_creation_date(input_path)
+        except Exception as e:
+            warning = (f"Warning: Could not extract creation date of "
+                       f"{os.path.basename(input_path)}: {e}")
+
+    # Open and convert image
+    with timer.stage('decode'):
+        img = Image.open(input_path)
+    try:
+        with timer.stage('metadata'):
             # Get EXIF data if available
             exif_dict = None
             if 'exif' in img.info:
                 exif_dict = piexif.load(img.info['exif'])
 
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Create white background
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'RGBA':
-                    # Use alpha channel as mask
-                    background.paste(img, mask=img.split()[3])
-                else:
-                    background.paste(img)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-
-            # Save as JPG with original EXIF data if available
-            if exif_dict:
-                exif_bytes = piexif.dump(exif_dict)
-                img.save(output_path, 'JPEG', quality=95, exif=exif_bytes)
-            else:
-                img.save(output_path, 'JPEG', quality=95)
+        with timer.stage('decode'):
+            # Flatten any transparency onto a white background
+            rgb = _flatten_alpha(img)
+            if rgb is not img:
+                img.close()
+                img = rgb
+        _downscale(img, profile, timer)
+
+        # Save with original EXIF data if available
+        with timer.stage('encode'):
+            exif_bytes = piexif.dump(exif_dict) if exif_dict else None
+            img.save(output_path, profile.format, **profile.save_options(exif_bytes))
+    finally:
+        img.close()
+
+    # If we found a creation date, update the file's modification time
+    if creation_date:
+        timestamp = creation_date.timestamp()
+        os.utime(output_path, (timestamp, timestamp))
+    return warning
+
+
+def convert_png_to_jpg(input_path, output_path=None, profile=None, durability="batch"):
+    """
+    Convert PNG file to JPG while preserving creation date.
+
+    Args:
+        profile (ConversionProfile or str, optional): Output settings, or the name
+            of one of CONVERSION_PROFILES. Defaults to 'high' (JPEG quality 95).
+        durability (str): Whether the output is synced to disk, see OutputWriter
+    """
+    profile = _conversion_profile(profile, 'high')
 
-        # If we found a creation date, update the file's modification time
-        if creation_date:
-            timestamp = creation_date.timestamp()
-            os.utime(output_path, (timestamp, timestamp))
+    # If output path is not specified, create one
+    if output_path is None:
+        output_path = os.path.splitext(input_path)[0] + profile.extension
 
+    try:
+        warning = _convert_one(_convert_png_to_jpg, input_path, output_path, profile,
+                               durability)
+        if warning is not None:
+            print(warning)
         return True
 
     except Exception as e:
@@ -534,39 +3199,360 @@ def convert_png_to_jpg(input_path, output_path=None):
         return False
 
 
-def batch_convert_png_to_jpg(input_folder, output_folder=None):
-    """Convert all PNG files in a folder to JPG."""
+def batch_convert_png_to_jpg(input_folder, output_folder=None, workers=1, pool="process",
+                             incremental=False, duplicates=None, monitor=None, profile=None,
+                             durability="batch"):
+    """
+    Convert all PNG files in a folder to JPG.
+
+    Args:
+        workers (int): Number of parallel workers (None uses all CPUs)
+        pool (str): 'process' or 'thread' worker pool
+        incremental (bool): Skip files already converted from an unchanged source
+        duplicates (DuplicateIndex, optional): Skip files whose content
+            duplicates another file of the folder
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+        profile (ConversionProfile or str, optional): Output settings, or the name
+            of one of CONVERSION_PROFILES
+        durability (str): When outputs are synced to disk, see OutputWriter
+    """
     if output_folder is None:
         output_folder = input_folder
 
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    success_count = 0
-    fail_count = 0
+    _batch_convert(_convert_png_to_jpg, input_folder, output_folder, '.png', workers, pool,
+                   incremental, duplicates, monitor, profile, 'high', durability)
 
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith('.png'):
-            input_path = os.path.join(input_folder, filename)
-            output_path = os.path.join(output_folder,
-                                       os.path.splitext(filename)[0] + '.jpg')
 
-            if convert_png_to_jpg(input_path, output_path):
-                success_count += 1
-            else:
-                fail_count += 1
+PREVIEW_SIZE = 160
+PREVIEW_EXTENSIONS = image_extensions | {'.heic', '.png'}
+JPEG_MAX_SIZE = 65500
+EXIF_ORIENTATION_TRANSPOSE = {2: Image.Transpose.FLIP_LEFT_RIGHT,
+                              3: Image.Transpose.ROTATE_180,
+                              4: Image.Transpose.FLIP_TOP_BOTTOM,
+                              5: Image.Transpose.TRANSPOSE,
+                              6: Image.Transpose.ROTATE_270,
+                              7: Image.Transpose.TRANSVERSE,
+                              8: Image.Transpose.ROTATE_90}
+
+
+def _exif_thumbnail(image_path):
+    """
+    Read the JPEG thumbnail embedded in the EXIF block of a JPEG or HEIC file.
+
+    Returns:
+        tuple: (thumbnail, orientation), the thumbnail bytes or None and the
+        image's EXIF Orientation or None
+    """
+    ext = os.path.splitext(image_path)[1].lower()
+    if ext == '.heic':
+        _register_heif_opener_once()
+        with Image.open(image_path) as img:
+            exif = img.info.get('exif')
+    elif ext in ('.jpg', '.jpeg'):
+        with open(image_path, 'rb') as f:
+            start, end = _locate_jpeg_exif(f)
+            if start == end:
+                return None, None
+            f.seek(start + 4)
+            exif = f.read(end - start - 4)
+    else:
+        return None, None
+    if not exif:
+        return None, None
+    exif_dict = piexif.load(exif)
+    return exif_dict.get('thumbnail') or None, \
+        exif_dict['0th'].get(piexif.ImageIFD.Orientation)
+
+
+def make_preview(image_path, max_size=PREVIEW_SIZE, quality=85):
+    """
+    Make a small JPEG preview of an image without decoding it at full size.
+
+    The thumbnail embedded in the EXIF block (the "1st" IFD) is used when it is
+    at least max_size on its longest side. Otherwise the image is decoded at
+    reduced size: JPEGs are scaled by the decoder (Image.draft) and HEIC files
+    decode their embedded HEIF thumbnail when they have a large enough one.
+    Previews are turned upright according to the EXIF Orientation.
+
+    Args:
+        image_path (str): Path to a JPEG, TIFF, PNG or HEIC image
+        max_size (int): Longest side of the preview in pixels
+        quality (int): JPEG quality of the preview
+
+    Returns:
+        bytes: The preview as a JPEG file
+    """
+    thumbnail, orientation = _exif_thumbnail(image_path)
+    transpose = EXIF_ORIENTATION_TRANSPOSE.get(orientation)
+    if thumbnail:
+        try:
+            with Image.open(io.BytesIO(thumbnail)) as img:
+                if max(img.size) == max_size and transpose is None:
+                    return thumbnail
+                if max(img.size) >= max_size:
+                    img.thumbnail((max_size, max_size))
+                    # The thumbnail is stored as the sensor saw it, like the image
+                    return _encode_preview(
+                        img.transpose(transpose) if transpose is not None else img, quality)
+        except Exception:
+            # Corrupt thumbnail: fall back to the image itself
+            pass
+
+    if os.path.splitext(image_path)[1].lower() == '.heic':
+        _register_heif_opener_once()
+    with Image.open(image_path) as img:
+        # Calls draft() first, which picks the reduced-size decode
+        img.thumbnail((max_size, max_size))
+        return _encode_preview(ImageOps.exif_transpose(img), quality)
+
+
+def _encode_preview(img, quality):
+    """Encode a preview image as JPEG bytes, flattening transparency."""
+    img = _flatten_alpha(img)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class PreviewCache:
+    """
+    Size-capped SQLite cache of image previews, evicting the least recently used.
+
+    Previews are keyed by absolute path and preview size, and are only returned
+    while the file's size and mtime are unchanged, so edited images get new
+    previews. Once the stored previews exceed max_bytes, the least recently
+    used ones are deleted.
+
+    Args:
+        db_path (str): Path to the SQLite database file
+        max_bytes (int): Total size of the stored previews
+        max_size (int): Longest side of the previews in pixels
+        commit_every (int): Number of writes between commits
+    """
+
+    def __init__(self, db_path, max_bytes=256 * 1024 * 1024, max_size=PREVIEW_SIZE,
+                 commit_every=1000):
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS previews ("
+            "path TEXT NOT NULL, max_size INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, last_used REAL NOT NULL, data BLOB NOT NULL, "
+            "PRIMARY KEY (path, max_size))")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS previews_last_used ON previews (last_used)")
+        self._bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM previews").fetchone()[0]
+
+    def get(self, image_path):
+        """Return the JPEG preview of an image, making and storing it on a miss."""
+        path = os.path.abspath(image_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, data FROM previews WHERE path = ? AND max_size = ?",
+                (path, self.max_size)).fetchone()
+            if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                self._conn.execute(
+                    "UPDATE previews SET last_used = ? WHERE path = ? AND max_size = ?",
+                    (time.time(), path, self.max_size))
+                self._written()
+                return row[2]
+
+        # Decode outside the lock, so threads make previews in parallel
+        data = make_preview(path, self.max_size)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT LENGTH(data) FROM previews WHERE path = ? AND max_size = ?",
+                (path, self.max_size)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO previews (path, max_size, size, mtime_ns, last_used, "
+                "data) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, self.max_size, stat.st_size, stat.st_mtime_ns, time.time(), data))
+            self._bytes += len(data) - (old[0] if old else 0)
+            self._evict()
+            self._written()
+        return data
+
+    def _evict(self):
+        """Delete the least recently used previews until the cache fits max_bytes."""
+        if self._bytes <= self.max_bytes:
+            return
+        evicted = []
+        for path, max_size, length in self._conn.execute(
+                "SELECT path, max_size, LENGTH(data) FROM previews ORDER BY last_used"):
+            if self._bytes <= self.max_bytes:
+                break
+            evicted.append((path, max_size))
+            self._bytes -= length
+        self._conn.executemany(
+            "DELETE FROM previews WHERE path = ? AND max_size = ?", evicted)
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def contact_sheet(input_folder, output_path, cache=None, columns=10, workers=4,
+                  recursive=False, monitor=None):
+    """
+    Render previews of all images in a folder onto one JPEG grid for review.
+
+    Previews come from make_preview, through cache when one is given, so no
+    image is decoded at full size and repeated sheets of the same folder only
+    read the cache. JPEG images are at most 65500 pixels high: a grid taller
+    than that is split into pages named like output_path with -1, -2, ...
+    appended.
+
+    Args:
+        input_folder (str): Folder containing JPEG, TIFF, PNG or HEIC images
+        output_path (str): Path of the contact sheet JPEG
+        cache (PreviewCache, optional): Stores previews for later sheets
+        columns (int): Number of previews per row
+        workers (int): Number of threads making previews
+        recursive (bool): Also include images in subfolders of input_folder
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+
+    Returns:
+        list: The image paths in grid order, row by row
+    """
+    tile = cache.max_size if cache is not None else PREVIEW_SIZE
+    if columns * tile > JPEG_MAX_SIZE:
+        raise ValueError(f"{columns} columns of {tile} px exceed the JPEG width limit")
+    preview = cache.get if cache is not None else make_preview
+    monitor = monitor or BatchMonitor()
+    monitor.begin("contact_sheet")
+    log = monitor.message
+
+    base, ext = os.path.splitext(os.path.abspath(output_path))
+    sheet_pattern = re.compile(re.escape(base) + r'(-\d+)?' + re.escape(ext))
+    with monitor.stage('scan'):
+        # Leave out earlier sheets written into the folder
+        paths = sorted(entry.path for entry in scan_files(
+            input_folder, PREVIEW_EXTENSIONS, recursive)
+            if not sheet_pattern.fullmatch(os.path.abspath(entry.path)))
+
+    per_page = JPEG_MAX_SIZE // tile * columns
+    pages = max(1, -(-len(paths) // per_page))
+    sheet_paths = [output_path] if pages == 1 else [
+        f"{os.path.splitext(output_path)[0]}-{page + 1}{ext}" for page in range(pages)]
+
+    def new_sheet(page):
+        rows = max(1, -(-min(per_page, len(paths) - page * per_page) // columns))
+        return Image.new('RGB', (columns * tile, rows * tile), (255, 255, 255))
+
+    def save_sheet(sheet, page):
+        with monitor.stage('encode'):
+            sheet.save(sheet_paths[page], 'JPEG', quality=85)
 
-    print(f"\nConversion complete!")
-    print(f"Successfully converted: {success_count} files")
-    print(f"Failed conversions: {fail_count} files")
+    failed = 0
+    sheet = new_sheet(0)
+    jobs = ((path,) for path in paths)
+    for i, (job, timed, error) in enumerate(run_batch(_TimedCall(preview), jobs, workers)):
+        page, slot = divmod(i, per_page)
+        if slot == 0 and page > 0:
+            # Only one page is held in memory at a time
+            save_sheet(sheet, page - 1)
+            sheet = new_sheet(page)
+        x, y = (slot % columns) * tile, (slot // columns) * tile
+        if error is not None:
+            failed += 1
+            monitor.file_done(job[0], 'failed')
+            log(f"Failed to preview {os.path.basename(job[0])}: {str(error)}")
+            sheet.paste((200, 200, 200), (x, y, x + tile, y + tile))
+            continue
+        data, seconds = timed
+        monitor.add_stage('preview', seconds)
+        monitor.file_done(job[0], seconds=seconds)
+        with monitor.stage('paste'):
+            with Image.open(io.BytesIO(data)) as img:
+                # Center the preview in its tile
+                sheet.paste(img, (x + (tile - img.width) // 2, y + (tile - img.height) // 2))
+
+    save_sheet(sheet, pages - 1)
+    log(f"Contact sheet of {len(paths)} images saved to: {', '.join(sheet_paths)}")
+    if failed > 0:
+        log(f"Failed to preview: {failed}")
+    monitor.finish()
+    return paths
+
+
+# yyyy-mm-dd, yyyymmdd, yyyy.mm.dd or yyyy_mm_dd with one separator used throughout.
+# Camera prefixes such as IMG_, PXL_ or VID_ need no special casing: the date is
+# searched for anywhere in the name.
+DATE_IN_NAME_PATTERN = re.compile(
+    r'((?:19|20)\d\d)([-._]?)(0[1-9]|1[0-2])\2(0[1-9]|[12]\d|3[01])')
+
+
+def match_date_in_name(filename):
+    """
+    Find the first valid calendar date in a filename.
+
+    Returns:
+        tuple: (year, month, day) as strings, or None if there is no valid date
+    """
+    match = DATE_IN_NAME_PATTERN.search(filename)
+    while match:
+        year, _, month, day = match.groups()
+        if day <= '28':
+            return year, month, day
+        try:
+            datetime(int(year), int(month), int(day))
+            return year, month, day
+        except ValueError:
+            # e.g. 2023-02-30: look for another date starting further on
+            match = DATE_IN_NAME_PATTERN.search(filename, match.start() + 1)
+    return None
+
+
+def move_files_by_name(input_folder, output_folder, dry_run=False, plan_path=None,
+                       monitor=None):
+    """
+    Move files into mmdd folders based on a date in their name.
 
+    Files without a date in their name go to a sibling unknown folder.
 
-def move_files_by_name(input_folder, output_folder):
+    Args:
+        dry_run (bool): Only plan the moves, don't touch any file
+        plan_path (str, optional): Write the plan to this .json or .csv file
+        monitor (BatchMonitor, optional): Receives timings and messages instead
+            of printing them
+
+    Returns:
+        list: The planned operations
+    """
     root_folder = os.path.dirname(input_folder)
     unknown_folder = os.path.join(root_folder, "unknown")
 
     # Create unknown folder
-    os.makedirs(unknown_folder, exist_ok=True)
+    if not dry_run:
+        os.makedirs(unknown_folder, exist_ok=True)
 
     # Dictionary to track statistics
     stats = {
@@ -575,61 +3561,690 @@ def move_files_by_name(input_folder, output_folder):
         'failed': 0
     }
 
-   # Regular expressions for date patterns with validation
-    patterns = [
-        # yyyy-mm-dd: Matches 1900-2099, months 01-12, days 01-31
-        r'(?P<year>19\d{2}|20\d{2})-(?P<month>0[1-9]|1[0-2])-(?P<day>0[1-9]|[12]\d|3[01])',
+    monitor = monitor or BatchMonitor()
+    monitor.begin("move_files_by_name")
+    log = monitor.message
+    plan = []
+    dated = []
+    for entry in monitor.timed('scan', scan_files(input_folder)):
+        if entry.name == MANIFEST_FILENAME:
+            continue
+        filename = entry.name
+        date = match_date_in_name(filename)
 
-        # yyyymmdd: Matches 1900-2099, months 01-12, days 01-31
-        r'(?P<year>19\d{2}|20\d{2})(?P<month>0[1-9]|1[0-2])(?P<day>0[1-9]|[12]\d|3[01])',
+        if date:
+            # Extract month and day
+            year, month, day = date
 
-        # Also match with dots: yyyy.mm.dd
-        r'(?P<year>19\d{2}|20\d{2})\.(?P<month>0[1-9]|1[0-2])\.(?P<day>0[1-9]|[12]\d|3[01])',
+            # Move file to its mmdd folder
+            dest_path = os.path.join(output_folder, f"{month}{day}", filename)
 
-        # Also match with underscores: yyyy_mm_dd
-        r'(?P<year>19\d{2}|20\d{2})_(?P<month>0[1-9]|1[0-2])_(?P<day>0[1-9]|[12]\d|3[01])'
-    ]
+        # If no date pattern found, move to unknown folder
+        else:
+            dest_path = os.path.join(unknown_folder, filename)
 
-    for filename in os.listdir(input_folder):
-        input_path = os.path.join(input_folder, filename)
+        plan.append({'action': 'move', 'source': entry.path, 'destination': dest_path})
+        dated.append(date is not None)
 
-        # Skip if it's a directory
-        if os.path.isdir(input_path):
-            continue
+    failed = []
+    with monitor.stage('execute'):
+        _finish_plan(plan, dry_run, plan_path, log=log, failed=failed)
 
-        try:
-            date_found = False
+    # Count what was actually moved, a failed move is neither matched nor unknown
+    failed_sources = {operation['source'] for operation in failed}
+    for operation, is_dated in zip(plan, dated):
+        if operation['source'] in failed_sources:
+            stats['failed'] += 1
+        elif is_dated:
+            stats['matched'] += 1
+        else:
+            stats['unknown'] += 1
 
-            # Check each pattern
-            for pattern in patterns:
-                match = re.search(pattern, filename)
-                if match:
-                    # Extract month and day
-                    year, month, day = match.groups()
+    # Print summary
+    log("\nProcessing complete:")
+    log(f"Files matched and sorted: {stats['matched']}")
+    log(f"Files without date pattern: {stats['unknown']}")
+    log(f"Failed to process: {stats['failed']}")
+    monitor.finish()
+    return plan
 
-                    # Create mmdd folder
-                    mmdd_folder = os.path.join(output_folder, f"{month}{day}")
-                    os.makedirs(mmdd_folder, exist_ok=True)
 
-                    # Move file to appropriate folder
-                    dest_path = os.path.join(mmdd_folder, filename)
-                    shutil.move(input_path, dest_path)
+PIPELINE_STAGES = ('invalid', 'dedupe', 'convert', 'set_date', 'filter_year',
+                   'short_videos', 'sort_by_name')
+_PIPELINE_CONVERTERS = {'.heic': _convert_heic_to_jpg, '.png': _convert_png_to_jpg}
+_PIPELINE_EXTENSIONS = image_extensions | set(_PIPELINE_CONVERTERS) | {'.mp4', '.m4v', '.mov'}
 
-                    stats['matched'] += 1
-                    date_found = True
-                    break
 
-            # If no date pattern found, move to unknown folder
-            if not date_found:
-                shutil.move(input_path, os.path.join(unknown_folder, filename))
-                stats['unknown'] += 1
+def load_pipeline(pipeline_path):
+    """
+    Read a pipeline definition from a .toml or .json file.
 
-        except Exception as e:
-            stats['failed'] += 1
-            print(f"Failed to process {filename}: {str(e)}")
+    A pipeline names its input and output folders and lists its stages in
+    order, each with an 'op' and the stage's options, e.g.
 
-    # Print summary
-    print("\nProcessing complete:")
-    print(f"Files matched and sorted: {stats['matched']}")
-    print(f"Files without date pattern: {stats['unknown']}")
-    print(f"Failed to process: {stats['failed']}")
+        input = "/photos/inbox"
+        output = "/photos/sorted"
+        workers = 4
+
+        [[stages]]
+        op = "convert"
+        profile = "compact"
+
+        [[stages]]
+        op = "filter_year"
+        year = 2023
+
+    Returns:
+        dict: The pipeline definition
+    """
+    if pipeline_path.lower().endswith('.toml'):
+        with open(pipeline_path, 'rb') as f:
+            return tomllib.load(f)
+    with open(pipeline_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _pipeline_stages(stages):
+    """Validate pipeline stages and parse their options, raising ValueError if invalid."""
+    parsed = []
+    for stage in stages:
+        options = dict(stage)
+        op = options.pop('op', None)
+        if op not in PIPELINE_STAGES:
+            raise ValueError(f"Unknown pipeline stage: {op}")
+        if op == 'convert':
+            options['profile'] = _conversion_profile(options.get('profile'), 'archive')
+        elif op == 'set_date':
+            if ('date' in options) == ('shift' in options):
+                raise ValueError("set_date needs exactly one of 'date' or 'shift'")
+            if isinstance(options.get('date'), str):
+                options['date'] = datetime.strptime(options['date'], '%Y:%m:%d %H:%M:%S')
+            elif 'shift' in options:
+                options['shift'] = timedelta(**options['shift'])
+        elif op == 'filter_year':
+            options['year'] = int(options['year'])
+        elif op == 'short_videos':
+            options['max_duration'] = float(options.get('max_duration', 4))
+        parsed.append((op, options))
+
+    # Dates are written as EXIF after the conversion, which only JPEG outputs carry
+    formats = [options['profile'].format for op, options in parsed if op == 'convert']
+    if any(op == 'set_date' for op, options in parsed) and \
+            any(fmt != 'JPEG' for fmt in formats):
+        raise ValueError("set_date cannot follow a convert stage with a non-JPEG profile")
+    return parsed
+
+
+def _run_pipeline_file(input_path, input_folder, metadata, stages, output_folder, strategy,
+                       dry_run):
+    """
+    Run all stages of a pipeline on one file.
+
+    The stages only decide what happens: routing stages pick the destination
+    subfolder, convert and set_date record what to write. The output is then
+    written in one step, so the file is read at most once for its metadata and
+    once for its output. Files from subfolders of input_folder keep their
+    subfolder under the routing folders, and a failed conversion or date edit
+    leaves no partial output behind.
+
+    Returns:
+        dict: 'destination', 'actions', 'metadata' (if it was read from the
+        file, else None), 'messages' and 'timings' (seconds per stage)
+    """
+    timer = StageTimer()
+    name = os.path.basename(input_path)
+    ext = os.path.splitext(name)[1].lower()
+    is_video = _is_video(input_path)
+    result = {'metadata': None, 'messages': []}
+    folders = []
+    convert = profile = new_date = None
+
+    def file_metadata():
+        nonlocal metadata
+        if metadata is None:
+            with timer.stage('metadata'):
+                metadata = result['metadata'] = _file_metadata(input_path)
+        return metadata
+
+    for op, options in stages:
+        if op == 'invalid':
+            if ext not in _PIPELINE_EXTENSIONS:
+                folders = ['invalid_files']
+                result['messages'].append(f"******** Moving {name} (Unknown file type)")
+                break
+        elif op == 'convert':
+            if ext in _PIPELINE_CONVERTERS:
+                convert, profile = _PIPELINE_CONVERTERS[ext], options['profile']
+                name = os.path.splitext(name)[0] + profile.extension
+        elif op == 'set_date':
+            if not is_video and convert is None and ext not in image_extensions:
+                result['messages'].append(f"Cannot set the date of {name}, left unchanged")
+            elif 'date' in options:
+                new_date = options['date']
+            else:
+                # Shift the movie header time of videos, as modify_video_dates does
+                date = new_date
+                if date is None and is_video:
+                    with timer.stage('metadata'):
+                        date = read_mp4_creation_time(input_path)
+                elif date is None:
+                    date = file_metadata()['capture_date']
+                if date is None:
+                    result['messages'].append(f"No date to shift in {name}, left unchanged")
+                else:
+                    new_date = date + options['shift']
+        elif op == 'filter_year':
+            date = new_date
+            if date is None and ext in _PIPELINE_EXTENSIONS:
+                date = file_metadata()['capture_date']
+            if date is None and is_video:
+                date = datetime.fromtimestamp(os.stat(input_path).st_mtime)
+            folders.append(f"year_{options['year']}"
+                           if date is not None and date.year == options['year']
+                           else "other_years")
+        elif op == 'short_videos':
+            if is_video:
+                duration = file_metadata()['duration']
+                if not duration:
+                    with timer.stage('metadata'):
+                        duration = _video_duration(input_path)
+                if duration < options['max_duration']:
+                    folders.append("short_videos")
+        elif op == 'sort_by_name':
+            date = match_date_in_name(name)
+            folders.append(f"{date[1]}{date[2]}" if date else "unknown")
+
+    subfolder = os.path.relpath(os.path.dirname(input_path), input_folder)
+    destination = os.path.normpath(os.path.join(output_folder, *folders, subfolder, name))
+    actions = (['convert'] if convert is not None else []) + \
+        (['set_date'] if new_date is not None else [])
+    result.update(destination=destination, actions=actions or [strategy])
+
+    if not dry_run:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if convert is None and new_date is None:
+            with timer.stage('place'):
+                _apply_operation(strategy, input_path, destination)
+        else:
+            if _resolved_path(destination) != _resolved_path(input_path) and \
+                    os.path.exists(destination) and os.path.samefile(input_path, destination):
+                # A link to the input from an earlier run: writing it would edit the input
+                os.remove(destination)
+            existed = os.path.lexists(destination)
+            try:
+                source = input_path
+                warning = None
+                if convert is not None:
+                    warning = convert(input_path, destination, timer, profile)
+                    source = destination
+                if new_date is not None:
+                    with timer.stage('set_date'):
+                        if is_video:
+                            warning = _modify_video_date(
+                                source, destination, new_date,
+                                time.mktime(new_date.timetuple()), "patch", None)[1]
+                        else:
+                            _modify_image_date(
+                                source, destination,
+                                new_date.strftime('%Y:%m:%d %H:%M:%S').encode('utf-8'))
+            except Exception:
+                # Don't leave a half-written output for the next run to skip
+                if not existed and os.path.lexists(destination):
+                    os.remove(destination)
+                raise
+            if warning is not None:
+                result['messages'].append(warning)
+
+    result['timings'] = timer.totals
+    return result
+
+
+def _report_pipeline_file(input_path, result, seconds, index, monitor):
+    """Hand one _run_pipeline_file result to the monitor and the metadata index."""
+    for message in result['messages']:
+        monitor.message(message)
+    for name, stage_seconds in result['timings'].items():
+        monitor.add_stage(name, stage_seconds)
+    if index is not None and result['metadata'] is not None:
+        index.put(input_path, result['metadata'])
+    monitor.file_done(input_path, seconds=seconds)
+
+
+def run_pipeline(pipeline, dry_run=False, index=None, monitor=None):
+    """
+    Run a pipeline of operations over a folder in a single pass.
+
+    The input folder is scanned once and each file goes through all stages in
+    one job: its metadata is read once and shared by every stage that needs it,
+    and its output is written once. Stages, in the order given:
+
+        invalid       Route files that are neither images nor videos to invalid_files/
+        dedupe        Skip files whose content duplicates another file (runs first)
+        convert       Convert HEIC/PNG images with 'profile' (default 'archive')
+        set_date      Set 'date' ('YYYY:MM:DD HH:MM:SS'), or move each file's date
+                      by 'shift' (timedelta arguments, e.g. {hours = -3})
+        filter_year   Route files to year_<year>/ or other_years/
+        short_videos  Route videos shorter than 'max_duration' seconds (default 4)
+                      to short_videos/
+        sort_by_name  Route files to mmdd/ from the date in their name, else unknown/
+
+    Routing folders nest in stage order, e.g. filter_year then sort_by_name
+    writes output/year_2023/0601/IMG_20230601.jpg. Files that are neither
+    converted nor re-dated are placed with the pipeline's strategy.
+
+    Args:
+        pipeline (str or dict): Pipeline file (see load_pipeline) or definition
+            with 'input', 'output' and 'stages', and optionally 'recursive',
+            'workers', 'pool' ('thread' or 'process') and 'strategy' ('copy',
+            'hardlink', 'reflink', 'symlink' or 'move', default 'copy')
+        dry_run (bool): Only plan the outputs, don't write any file
+        index (MetadataIndex, optional): Cache of previously extracted metadata
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+
+    Returns:
+        list: {'source', 'destination', 'actions'} of every processed file
+    """
+    if isinstance(pipeline, str):
+        pipeline = load_pipeline(pipeline)
+    input_folder = pipeline['input']
+    output_folder = pipeline['output']
+    stages = _pipeline_stages(pipeline.get('stages', []))
+    strategy = pipeline.get('strategy', 'copy')
+    if strategy not in PLAN_ACTIONS:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    workers = pipeline.get('workers', 1)
+    pool = pipeline.get('pool', 'thread')
+
+    monitor = monitor or BatchMonitor()
+    monitor.begin("run_pipeline")
+    log = monitor.message
+    counter = BatchCounter('successful', 'failed', 'duplicates')
+
+    entries = monitor.timed('scan', (
+        entry for entry in scan_files(input_folder, recursive=pipeline.get('recursive', False),
+                                      exclude=[output_folder])
+        if entry.name != MANIFEST_FILENAME))
+    if any(op == 'dedupe' for op, options in stages):
+        with DuplicateIndex() as duplicates:
+            entries = _skip_duplicates(entries, duplicates, counter, log)
+
+    jobs = (
+        (entry.path, input_folder,
+         index.get(entry.path, entry.stat()) if index is not None else None,
+         stages, output_folder, strategy, dry_run)
+        for entry in entries
+    )
+
+    processed = []
+    for job, timed, error in run_batch(_TimedCall(_run_pipeline_file), jobs, workers, pool):
+        filename = os.path.basename(job[0])
+        if error is not None:
+            counter.increment('failed')
+            monitor.file_done(job[0], 'failed')
+            log(f"Failed to process {filename}: {str(error)}")
+            continue
+        result, seconds = timed
+        _report_pipeline_file(job[0], result, seconds, index, monitor)
+        if dry_run:
+            log(f"{job[0]} -> {result['destination']} ({', '.join(result['actions'])})")
+        counter.increment('successful')
+        processed.append({'source': job[0], 'destination': result['destination'],
+                          'actions': result['actions']})
+
+    log("\nProcessing complete:")
+    log(f"Files {'planned' if dry_run else 'processed'}: {counter['successful']}")
+    if counter['duplicates'] > 0:
+        log(f"Skipped (duplicate content): {counter['duplicates']}")
+    log(f"Failed to process: {counter['failed']}")
+    log(f"Output folder: {output_folder}")
+    monitor.finish()
+    return processed
+
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def _file_signature(path):
+    """Return (size, mtime_ns) of a file, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _InotifyWatcher:
+    """
+    Reports files written or moved into a folder, from Linux inotify events.
+
+    Waiting for events costs nothing while the folder is idle. Subfolders created
+    later are watched as they appear; after an event queue overflow the folder
+    is rescanned once.
+    """
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, folder, recursive=False, exclude=()):
+        self.folder = folder
+        self.recursive = recursive
+        self.exclude = list(exclude)
+        self._excluded = {os.path.realpath(path) for path in exclude}
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._folders = {}
+        self._watch(folder)
+
+    def _watch(self, folder):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), folder)
+        self._folders[wd] = folder
+        if self.recursive:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) \
+                            and os.path.realpath(entry.path) not in self._excluded:
+                        self._watch(entry.path)
+
+    def changes(self, timeout):
+        """Wait up to timeout seconds and return the paths of changed files."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length]
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                paths.extend(entry.path for entry in scan_files(
+                    self.folder, recursive=self.recursive, exclude=self.exclude))
+                continue
+            if mask & IN_IGNORED:
+                self._folders.pop(wd, None)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None:
+                continue
+            path = os.path.join(folder, os.fsdecode(name.rstrip(b'\x00')))
+            if not mask & IN_ISDIR:
+                paths.append(path)
+            elif self.recursive and os.path.realpath(path) not in self._excluded:
+                # Files moved in with the folder produce no events of their own
+                try:
+                    self._watch(path)
+                except OSError:
+                    continue
+                paths.extend(entry.path for entry in scan_files(
+                    path, recursive=True, exclude=self.exclude))
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollWatcher:
+    """Reports changed files by comparing folder listings every interval seconds."""
+
+    def __init__(self, folder, recursive=False, exclude=(), interval=5.0):
+        self.folder = folder
+        self.recursive = recursive
+        self.exclude = list(exclude)
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        snapshot = {}
+        for entry in scan_files(self.folder, recursive=self.recursive, exclude=self.exclude):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def changes(self, timeout):
+        """Wait up to timeout seconds and return the paths of changed files."""
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(wait, 0))
+        snapshot = self._scan()
+        paths = [path for path, signature in snapshot.items()
+                 if self._snapshot.get(path) != signature]
+        self._snapshot = snapshot
+        self._next_scan = time.monotonic() + self.interval
+        return paths
+
+    def close(self):
+        pass
+
+
+def watch_folder(pipeline, settle=2.0, queue_size=64, poll_interval=None, index=None,
+                 monitor=None, stop_event=None):
+    """
+    Run a pipeline on files as they arrive in its input folder, until stopped.
+
+    The folder is watched with inotify, so an idle folder is never rescanned;
+    where inotify is unavailable, or poll_interval is given, it is rescanned
+    every poll_interval seconds (default 5). A file is processed once it has
+    not changed for settle seconds, so partially written uploads are left
+    alone. Ready files go through a bounded queue to the pipeline's workers,
+    which run the same per-file stages as run_pipeline; the watcher waits while
+    the queue is full. Files already in the folder are picked up on start, once
+    they have settled too.
+
+    A completion manifest in the output folder records processed files, so
+    restarts and repeated events skip files that are unchanged since. Hidden
+    files (such as the temporary files of rsync) are ignored, and the dedupe
+    stage is not supported as it needs the whole folder.
+
+    Args:
+        pipeline (str or dict): Pipeline file or definition, see run_pipeline.
+            'workers' threads process the queue.
+        settle (float): Seconds a file must stay unchanged before it is processed
+        queue_size (int): Maximum number of ready files waiting for a worker
+        poll_interval (float, optional): Poll instead of using inotify
+        index (MetadataIndex, optional): Cache of previously extracted metadata
+        monitor (BatchMonitor, optional): Receives progress, timings and messages
+            instead of printing them
+        stop_event (threading.Event, optional): Stop watching once set; otherwise
+            the watch runs until interrupted
+    """
+    if isinstance(pipeline, str):
+        pipeline = load_pipeline(pipeline)
+    input_folder = pipeline['input']
+    output_folder = pipeline['output']
+    stages = _pipeline_stages(pipeline.get('stages', []))
+    if any(op == 'dedupe' for op, options in stages):
+        raise ValueError("The dedupe stage needs the whole folder and cannot be watched")
+    strategy = pipeline.get('strategy', 'copy')
+    if strategy not in PLAN_ACTIONS:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    recursive = pipeline.get('recursive', False)
+    workers = pipeline.get('workers', 1) or os.cpu_count() or 1
+    stop_event = stop_event or threading.Event()
+
+    monitor = monitor or BatchMonitor()
+    monitor.begin("watch_folder")
+    log = monitor.message
+    counter = BatchCounter('successful', 'failed', 'skipped')
+
+    # Moved sources cannot be checked against the manifest, and are gone anyway
+    os.makedirs(output_folder, exist_ok=True)
+    manifest = CompletionManifest(os.path.join(output_folder, MANIFEST_FILENAME)) \
+        if strategy != 'move' else None
+    settings = json.dumps(pipeline.get('stages', []), sort_keys=True, default=str)
+    process = _TimedCall(_run_pipeline_file)
+
+    def ingest(input_path):
+        metadata = None
+        if index is not None:
+            metadata = index.get(input_path)
+        try:
+            plan = _run_pipeline_file(input_path, input_folder, metadata, stages,
+                                      output_folder, strategy, True)
+            if manifest is not None and manifest.is_done(
+                    input_path, plan['destination'], settings):
+                counter.increment('skipped')
+                return
+            result, seconds = process(input_path, input_folder, plan['metadata'] or metadata,
+                                      stages, output_folder, strategy, False)
+            if manifest is not None:
+                manifest.record(input_path, result['destination'], settings)
+        except Exception as e:
+            counter.increment('failed')
+            monitor.file_done(input_path, 'failed')
+            log(f"Failed to process {os.path.basename(input_path)}: {str(e)}")
+            return
+        counter.increment('successful')
+        _report_pipeline_file(input_path, result, seconds, index, monitor)
+        log(f"Processed {os.path.basename(input_path)} -> {result['destination']}")
+
+    def consume():
+        while True:
+            input_path = ready.get()
+            if input_path is None:
+                return
+            ingest(input_path)
+
+    def ignored(path):
+        name = os.path.basename(path)
+        return name.startswith('.') or name == MANIFEST_FILENAME
+
+    ready = queue.Queue(maxsize=queue_size)
+    consumers = [threading.Thread(target=consume, daemon=True) for _ in range(workers)]
+    for consumer in consumers:
+        consumer.start()
+
+    exclude = [output_folder]
+    if poll_interval is None:
+        try:
+            watcher = _InotifyWatcher(input_folder, recursive, exclude)
+        except (OSError, AttributeError) as e:
+            poll_interval = 5.0
+            log(f"inotify is not available ({e}), polling every {poll_interval:g}s")
+    if poll_interval is not None:
+        watcher = _PollWatcher(input_folder, recursive, exclude, poll_interval)
+    log(f"Watching {input_folder}")
+
+    # Files waiting to settle: path -> (deadline, size and mtime when last changed)
+    pending = {}
+    try:
+        # Files found on start may still be being written, so they settle like new ones
+        deadline = time.monotonic() + settle
+        for entry in scan_files(input_folder, recursive=recursive, exclude=exclude):
+            if not ignored(entry.path):
+                pending[entry.path] = (deadline, _file_signature(entry.path))
+
+        while not stop_event.is_set():
+            now = time.monotonic()
+            timeout = min([deadline for deadline, _ in pending.values()] + [now + 1.0]) - now
+            for path in watcher.changes(max(timeout, 0)):
+                if not ignored(path):
+                    pending[path] = (time.monotonic() + settle, _file_signature(path))
+
+            now = time.monotonic()
+            for path, (deadline, signature) in list(pending.items()):
+                if deadline > now:
+                    continue
+                current = _file_signature(path)
+                if current is None:
+                    # Deleted or renamed before it settled
+                    del pending[path]
+                elif current != signature:
+                    pending[path] = (now + settle, current)
+                else:
+                    del pending[path]
+                    ready.put(path)
+    finally:
+        watcher.close()
+        for _ in consumers:
+            ready.put(None)
+        for consumer in consumers:
+            consumer.join()
+        if manifest is not None:
+            manifest.close()
+
+        log("\nStopped watching:")
+        log(f"Files processed: {counter['successful']}")
+        log(f"Skipped (already processed): {counter['skipped']}")
+        log(f"Failed to process: {counter['failed']}")
+        monitor.finish()
+
+
+def main(argv=None):
+    """Command-line entry point: run a pipeline file, see run_pipeline."""
+    parser = argparse.ArgumentParser(
+        prog="photo-dates",
+        description="Run a pipeline of photo and video operations over a folder in one pass.")
+    parser.add_argument('pipeline', help="pipeline definition (.toml or .json)")
+    parser.add_argument('--input', help="override the pipeline's input folder")
+    parser.add_argument('--output', help="override the pipeline's output folder")
+    parser.add_argument('--workers', type=int, help="override the pipeline's worker count")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="only show what would be written")
+    parser.add_argument('--index', help="MetadataIndex database caching extracted metadata")
+    parser.add_argument('--events', help="also append monitor events to this JSON lines file")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and process files as they arrive")
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="with --watch, seconds a file must be unchanged (default 2)")
+    parser.add_argument('--poll', type=float,
+                        help="with --watch, poll every POLL seconds instead of using inotify")
+    args = parser.parse_args(argv)
+
+    pipeline = load_pipeline(args.pipeline)
+    for key in ('input', 'output', 'workers'):
+        if getattr(args, key) is not None:
+            pipeline[key] = getattr(args, key)
+    for key in ('input', 'output'):
+        if key not in pipeline:
+            parser.error(f"the pipeline has no {key} folder")
+    try:
+        stages = _pipeline_stages(pipeline.get('stages', []))
+    except (ValueError, TypeError, KeyError) as e:
+        parser.error(f"invalid pipeline: {e}")
+    if args.watch and args.dry_run:
+        parser.error("--watch cannot be combined with --dry-run")
+    if args.watch and any(op == 'dedupe' for op, options in stages):
+        parser.error("the dedupe stage cannot be watched")
+
+    sinks = [print_sink]
+    if args.events:
+        sinks.append(JsonLinesSink(args.events))
+    index = MetadataIndex(args.index) if args.index else None
+    try:
+        if args.watch:
+            try:
+                watch_folder(pipeline, args.settle, poll_interval=args.poll, index=index,
+                             monitor=BatchMonitor(sinks))
+            except KeyboardInterrupt:
+                pass
+        else:
+            run_pipeline(pipeline, args.dry_run, index, BatchMonitor(sinks))
+    finally:
+        if index is not None:
+            index.close()
+        for sink in sinks[1:]:
+            sink.close()
+
+
+if __name__ == '__main__':
+    main()
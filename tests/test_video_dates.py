@@ -0,0 +1,57 @@
+import os
+import struct
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import image
+
+
+def _box(kind, payload):
+    return struct.pack('>I', 8 + len(payload)) + kind + payload
+
+
+def _write_mp4(path, creation_time=None, day=None):
+    """Write a minimal MP4 with a movie header and, optionally, a ©day tag."""
+    seconds = int((creation_time - image.MP4_EPOCH).total_seconds()) if creation_time else 0
+    mvhd = _box(b'mvhd', struct.pack(
+        '>BxxxIIII', 0, seconds, seconds, 1000, 2000) + bytes(80))
+    moov = mvhd
+    if day is not None:
+        data = _box(b'data', struct.pack('>II', 1, 0) + day.encode())
+        ilst = _box(b'ilst', _box(b'\xa9day', data))
+        hdlr = _box(b'hdlr', bytes(8) + b'mdirappl' + bytes(9))
+        moov += _box(b'udta', _box(b'meta', bytes(4) + hdlr + ilst))
+    with open(path, 'wb') as f:
+        f.write(_box(b'ftyp', b'isom' + bytes(4) + b'isommp41'))
+        f.write(_box(b'moov', moov))
+
+
+def test_video_date_comes_from_movie_header(tmp_path):
+    path = tmp_path / 'clip.mp4'
+    _write_mp4(path, creation_time=datetime(2021, 3, 15, 9, 30),
+               day='2019-01-01T00:00:00Z')
+    metadata = image._video_metadata(str(path))
+    assert metadata['date_source'] == 'mvhd'
+    assert (metadata['capture_date'].month, metadata['capture_date'].day) == (3, 15)
+
+
+def test_video_date_falls_back_to_full_day_tag(tmp_path):
+    path = tmp_path / 'clip.mp4'
+    _write_mp4(path, day='2020-07-04T18:05:00Z')
+    metadata = image._video_metadata(str(path))
+    assert metadata['date_source'] == '©day'
+    assert metadata['capture_date'] == datetime(2020, 7, 4, 18, 5)
+
+
+def test_video_without_a_full_date_falls_back_to_mtime(tmp_path):
+    path = tmp_path / 'clip.mp4'
+    _write_mp4(path, day='2020')
+    mtime = datetime(2018, 11, 23, 12, 0).timestamp()
+    os.utime(path, (mtime, mtime))
+    assert image._video_metadata(str(path))['capture_date'] is None
+    columns = image.resolve_capture_dates([str(path)], mtime_fallback=True)
+    assert columns['source'][0] == 'mtime'
+    date = columns['date'][0].astype(datetime)
+    assert (date.month, date.day) == (11, 23)